@@ -0,0 +1,11 @@
+import os
+
+import django
+
+# Тесты идут на SQLite, как при DEBUG_BOOL
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('DEBUG_BOOL', '1')
+
+
+def pytest_configure():
+    django.setup()
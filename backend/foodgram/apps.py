@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class FoodgramConfig(AppConfig):
+    name = 'foodgram'
+
+    def ready(self):
+        from . import db  # noqa: F401
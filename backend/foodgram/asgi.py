@@ -0,0 +1,16 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Hot read endpoints are served by async views from ``recipes.async_urls``,
+everything else by the same views as under WSGI.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'foodgram.asgi_urls')
+
+application = get_asgi_application()
@@ -0,0 +1,7 @@
+from django.urls import include, path
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/', include('recipes.async_urls')),
+] + wsgi_urlpatterns
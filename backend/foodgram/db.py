@@ -0,0 +1,16 @@
+import django
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+
+if django.VERSION < (4, 1):
+    @receiver(request_started)
+    def check_connections(**kwargs):
+        """CONN_HEALTH_CHECKS для Django до 4.1: постоянное соединение
+        (CONN_MAX_AGE), которое сервер успел закрыть, заменяется до первого
+        запроса к базе"""
+        for connection in connections.all():
+            if (connection.connection is not None
+                    and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                    and not connection.is_usable()):
+                connection.close()
@@ -36,9 +36,11 @@ INSTALLED_APPS = [
     'users',
     'recipes',
     'django_filters',
+    'foodgram',
 ]
 
 MIDDLEWARE = [
+    'recipes.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,7 +50,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram.urls'
+ROOT_URLCONF = os.getenv('DJANGO_ROOT_URLCONF', default='foodgram.urls')
 
 TEMPLATES = [
     {
@@ -87,10 +89,64 @@ else:
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default='5432')
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', default=60)),
+            # До Django 4.1 проверку делает foodgram.db
+            'CONN_HEALTH_CHECKS': True,
+            # Через pgbouncer в режиме transaction pooling именованные
+            # курсоры QuerySet.iterator() не переживают транзакцию
+            'DISABLE_SERVER_SIDE_CURSORS': bool(os.getenv('DB_POOLER')),
         }
     }
 
+# Общий для воркеров memcached задаётся CACHE_LOCATION (host:port), без
+# него кэш в памяти каждого процесса
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', default='')
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.memcached.PyMemcacheCache'
+            if CACHE_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+# Версии справочников, кэша ответов и журнал изменений для подбора по
+# ингридиентам работают, только если кэш видят все процессы
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+TASK_QUEUE = os.getenv('TASK_QUEUE', default='thread')
+TASK_QUEUE_THREADS = int(os.getenv('TASK_QUEUE_THREADS', default=1))
+
+RECIPES_RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RECIPES_RESPONSE_CACHE', default='1') == '1',
+    'TIMEOUT': int(os.getenv('RECIPES_RESPONSE_CACHE_TIMEOUT', default=600)),
+    'MAX_AGE': int(os.getenv('RECIPES_RESPONSE_MAX_AGE', default=30)),
+}
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+
+RECIPE_CARDS = os.getenv('RECIPE_CARDS', default='1') == '1'
+
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', default=500))
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+
+REQUEST_METRICS = {
+    'ENABLED': os.getenv('REQUEST_METRICS', default='1') == '1',
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', default=1)),
+    'LOW_OVERHEAD': bool(os.getenv('REQUEST_METRICS_LOW_OVERHEAD')),
+    'SLOW_REQUEST_MS': int(os.getenv('SLOW_REQUEST_MS', default=500)),
+    'DUPLICATE_QUERIES': 5,
+    'TOKEN': os.getenv('REQUEST_METRICS_TOKEN', default=''),
+    # Каталог, через который воркеры складывают метрики; задаётся
+    # в gunicorn.conf.py, без него метрики — только этого процесса
+    'DIR': os.getenv('REQUEST_METRICS_DIR', default=''),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -148,6 +204,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
 
 DJOSER = {
     'LOGIN_FIELD': 'email',
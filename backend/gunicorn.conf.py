@@ -0,0 +1,84 @@
+"""
+Gunicorn config for foodgram project.
+
+Worker and thread counts are derived from the number of CPUs and can be
+overridden with GUNICORN_WORKERS and GUNICORN_THREADS. The application is
+loaded in the master before forking, so workers start without importing
+Django again. The in-memory ingredient index used by
+/api/recipes/matching/ is loaded before workers take requests; set
+MATCHING_WARMUP=0 to load it on the first request instead.
+
+Request metrics of all workers are collected through files in
+REQUEST_METRICS_DIR (by default a directory next to worker_tmp_dir),
+which is emptied when gunicorn starts.
+"""
+
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', default=2))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = os.getenv('GUNICORN_PRELOAD', default='1') == '1'
+matching_warmup = os.getenv('MATCHING_WARMUP', default='1') == '1'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = max_requests // 10
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = '-'
+errorlog = '-'
+metrics_dir = os.environ.setdefault('REQUEST_METRICS_DIR', os.path.join(
+    worker_tmp_dir or tempfile.gettempdir(), 'foodgram-metrics'))
+
+
+def on_starting(server):
+    # Файлы метрик прошлого запуска: счётчики начинаются заново
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, '*.pickle*')):
+            os.remove(path)
+
+
+def warm_up_matching(log):
+    # Индекс ингридиентов загружается не в запросе пользователя: в master
+    # до запуска воркеров, которые получают его при fork, и в каждом
+    # воркере до первого запроса, где он догружает изменения
+    from recipes.matching import ingredient_index
+
+    try:
+        ingredient_index.sync()
+    except Exception:
+        log.exception('Не удалось загрузить индекс ингридиентов')
+
+
+def when_ready(server):
+    # Соединения с базой, открытые в master при загрузке приложения,
+    # закрываются до запуска воркеров, чтобы не достаться им всем сразу
+    if preload_app:
+        from django.db import connections
+
+        if matching_warmup:
+            warm_up_matching(server.log)
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if matching_warmup:
+        from django.db import connections
+
+        warm_up_matching(worker.log)
+        connections.close_all()
+
+
+def worker_exit(server, worker):
+    # Метрики после последней записи, например при перезапуске воркера
+    # по max_requests
+    from recipes.metrics import registry
+
+    registry.flush()
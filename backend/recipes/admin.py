@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from .cards import rebuild_cards
 from .models import (Favorite, Ingredients, Recipe, RecipeIngredients,
                      ShoppingCart, Subscribes, Tags)
+from .services import schedule_image_processing
 
 User = get_user_model()
 
@@ -21,13 +23,29 @@ class IngredientsAdmin(admin.ModelAdmin):
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ['name', 'author', 'is_favorited_count']
+    list_select_related = ['author']
     list_filter = ['author', 'name', 'tags']
     inlines = (RecipeIngredientsInline,)
     model = Recipe
 
     def is_favorited_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
     is_favorited_count.short_description = 'добавлено в избранное'
+    is_favorited_count.admin_order_field = 'favorites_count'
+
+    def save_model(self, request, obj, form, change):
+        """Копии прежнего фото сбрасываются тем же сохранением, а для
+        нового делаются в фоне, как в services.update_recipe"""
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            obj.image_variants = {}
+        super().save_model(request, obj, form, change)
+        if image_changed:
+            schedule_image_processing(obj)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        rebuild_cards([form.instance.pk])
 
 
 class UsersAdmin(admin.ModelAdmin):
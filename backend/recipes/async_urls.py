@@ -0,0 +1,19 @@
+from django.urls import path
+
+from .async_views import (download_shopping_cart, ingredient_detail,
+                          ingredients_list, recipe_detail, recipes_feed,
+                          recipes_list, recipes_matching, recipes_search,
+                          tag_detail, tags_list)
+
+urlpatterns = [
+    path('recipes/download_shopping_cart/', download_shopping_cart),
+    path('recipes/', recipes_list, name='recipe-list'),
+    path('recipes/search/', recipes_search, name='recipe-search'),
+    path('recipes/feed/', recipes_feed, name='recipe-feed'),
+    path('recipes/matching/', recipes_matching, name='recipe-matching'),
+    path('recipes/<pk>/', recipe_detail, name='recipe-detail'),
+    path('tags/', tags_list, name='tags-list'),
+    path('tags/<pk>/', tag_detail, name='tags-detail'),
+    path('ingredients/', ingredients_list, name='ingredients-list'),
+    path('ingredients/<pk>/', ingredient_detail, name='ingredients-detail'),
+]
@@ -0,0 +1,177 @@
+from contextlib import nullcontext
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+
+from .cache import ingredients_reference, tags_reference
+from .ingredients_index import search_ingredients
+from .metrics import current_metrics
+from .views import (AUTOCOMPLETE_CACHE_SECONDS, AUTOCOMPLETE_LIMIT,
+                    AUTOCOMPLETE_MAX_LIMIT, IngredientsGetList,
+                    RecipeViewSet, ShoppingCartLoadlist, TagsViewSet)
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def in_thread(func):
+    """Синхронная часть async-view в пуле потоков: соединения с базой
+    закрываются по CONN_MAX_AGE, как после обычного запроса, а запросы
+    к базе учитываются в метриках текущего запроса"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        metrics = current_metrics.get()
+        try:
+            with (connection.execute_wrapper(metrics) if metrics
+                  else nullcontext()):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def render_view(view, request, **kwargs):
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+class MaterializedShoppingCartLoadlist(ShoppingCartLoadlist):
+    """Список покупок читается из базы целиком в потоке: в Django 3.2
+    ASGI-обработчик перебирает StreamingHttpResponse в event loop,
+    где запросы к базе запрещены"""
+
+    def get_rows(self):
+        return list(super().get_rows())
+
+
+recipes_list_view = RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+# Как в роутере, view действий получают параметры @action: свои
+# пагинацию и права доступа
+recipes_search_view = RecipeViewSet.as_view(
+    {'get': 'search'}, **RecipeViewSet.search.kwargs)
+recipes_matching_view = RecipeViewSet.as_view(
+    {'get': 'matching'}, **RecipeViewSet.matching.kwargs)
+recipes_feed_view = RecipeViewSet.as_view(
+    {'get': 'feed'}, **RecipeViewSet.feed.kwargs)
+recipe_detail_view = RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'})
+tags_list_view = TagsViewSet.as_view({'get': 'list'})
+tag_detail_view = TagsViewSet.as_view({'get': 'retrieve'})
+ingredients_list_view = IngredientsGetList.as_view({'get': 'list'})
+ingredient_detail_view = IngredientsGetList.as_view({'get': 'retrieve'})
+shopping_list_view = MaterializedShoppingCartLoadlist.as_view()
+
+
+def csrf_exempt(view):
+    """Как у DRF-views, CSRF не проверяется; csrf_exempt из Django 3.2
+    обернул бы корутину синхронной функцией"""
+    view.csrf_exempt = True
+    return view
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), content_type='application/json',
+        status=status)
+
+
+async def reference_response(request, reference, get_data):
+    """Ответ справочника, как у ReferenceDataMixin: с ETag и 304. Номер
+    версии читается из кэша или из базы, поэтому в потоке: в event loop
+    блокирующие вызовы запрещены; данные справочника уже в памяти процесса,
+    ответ собирается без потока"""
+    version, data = await in_thread(reference.get)()
+    etag = f'"{reference.name}-{version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            response = json_response(get_data(data))
+        except (KeyError, ValueError):
+            response = json_response(
+                {'detail': NotFound.default_detail}, NotFound.status_code)
+    response['ETag'] = etag
+    return response
+
+
+@csrf_exempt
+async def recipes_list(request):
+    return await in_thread(render_view)(recipes_list_view, request)
+
+
+@csrf_exempt
+async def recipes_search(request):
+    return await in_thread(render_view)(recipes_search_view, request)
+
+
+@csrf_exempt
+async def recipes_matching(request):
+    return await in_thread(render_view)(recipes_matching_view, request)
+
+
+@csrf_exempt
+async def recipes_feed(request):
+    return await in_thread(render_view)(recipes_feed_view, request)
+
+
+@csrf_exempt
+async def recipe_detail(request, pk):
+    return await in_thread(render_view)(recipe_detail_view, request, pk=pk)
+
+
+@csrf_exempt
+async def download_shopping_cart(request):
+    return await in_thread(render_view)(shopping_list_view, request)
+
+
+@csrf_exempt
+async def tags_list(request):
+    if request.method not in READ_METHODS:
+        return await in_thread(render_view)(tags_list_view, request)
+    return await reference_response(
+        request, tags_reference, lambda data: list(data.values()))
+
+
+@csrf_exempt
+async def tag_detail(request, pk):
+    if request.method not in READ_METHODS:
+        return await in_thread(render_view)(tag_detail_view, request, pk=pk)
+    return await reference_response(
+        request, tags_reference, lambda data: data[int(pk)])
+
+
+@csrf_exempt
+async def ingredients_list(request):
+    if (request.method not in READ_METHODS
+            or 'search' in request.GET):
+        return await in_thread(render_view)(ingredients_list_view, request)
+    name = request.GET.get('name')
+    if name is None:
+        return await reference_response(
+            request, ingredients_reference, lambda data: list(data.values()))
+    try:
+        limit = min(int(request.GET['limit']), AUTOCOMPLETE_MAX_LIMIT)
+    except (KeyError, ValueError):
+        limit = AUTOCOMPLETE_LIMIT
+    response = await reference_response(
+        request, ingredients_reference,
+        lambda data: search_ingredients(name, max(limit, 1), data))
+    patch_cache_control(
+        response, public=True, max_age=AUTOCOMPLETE_CACHE_SECONDS)
+    return response
+
+
+@csrf_exempt
+async def ingredient_detail(request, pk):
+    if request.method not in READ_METHODS:
+        return await in_thread(render_view)(
+            ingredient_detail_view, request, pk=pk)
+    return await reference_response(
+        request, ingredients_reference, lambda data: data[int(pk)])
@@ -0,0 +1,351 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .cache import ingredients_reference, tags_reference
+from .cards import rebuild_cards
+from .feed import rebuild_feed
+from .models import (Favorite, Ingredients, Recipe, RecipeIngredients,
+                     ShoppingCart, ShoppingListItem, Subscribes, Tags)
+from .response_cache import invalidate_recipes
+from .services import get_counters_subqueries
+from .shopping_list import get_shopping_list_totals
+
+User = get_user_model()
+
+BENCHMARK_PREFIX = 'benchmark'
+PASSWORD = 'benchmark-password'
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+         'AAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def seed_dataset(users=50, recipes=500, ingredients_per_recipe=10,
+                 favorites=20, subscriptions=10, seed=0):
+    """Синтетические данные для замеров; возвращает id созданных объектов
+    и токен пользователя, от имени которого выполняются запросы"""
+    rnd = random.Random(seed)
+    password = make_password(None)
+    User.objects.bulk_create(
+        User(username=f'{BENCHMARK_PREFIX}{index}',
+             email=f'{BENCHMARK_PREFIX}{index}@example.com',
+             first_name='Bench', last_name='Mark', password=password)
+        for index in range(users))
+    users_ids = list(User.objects.filter(
+        username__startswith=BENCHMARK_PREFIX).values_list('id', flat=True))
+    Tags.objects.bulk_create((
+        Tags(name=f'{BENCHMARK_PREFIX} {index}', color='#000000',
+             slug=f'{BENCHMARK_PREFIX}-{index}')
+        for index in range(3)), ignore_conflicts=True)
+    tags_ids = list(Tags.objects.filter(
+        slug__startswith=BENCHMARK_PREFIX).values_list('id', flat=True))
+    Ingredients.objects.bulk_create((
+        Ingredients(name=f'{BENCHMARK_PREFIX} {index}', measurement_unit='г')
+        for index in range(max(ingredients_per_recipe * 5, 50))),
+        ignore_conflicts=True)
+    ingredients_ids = list(Ingredients.objects.filter(
+        name__startswith=BENCHMARK_PREFIX).values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        Recipe(author_id=rnd.choice(users_ids),
+               name=f'{BENCHMARK_PREFIX} {index}', text='text',
+               image='photos/benchmark.png', cooking_time=10)
+        for index in range(recipes))
+    recipes_ids = list(Recipe.objects.filter(
+        name__startswith=BENCHMARK_PREFIX).values_list('id', flat=True))
+    RecipeIngredients.objects.bulk_create(
+        RecipeIngredients(recipe_id=recipe_id, ingredients_id=ingredient_id,
+                          amount=rnd.randint(1, 500))
+        for recipe_id in recipes_ids
+        for ingredient_id in rnd.sample(
+            ingredients_ids, min(ingredients_per_recipe,
+                                 len(ingredients_ids))))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe_id, tags_id=tag_id)
+        for recipe_id in recipes_ids
+        for tag_id in rnd.sample(tags_ids, rnd.randint(1, len(tags_ids))))
+    for model, owner in ((Favorite, 'user_id'), (ShoppingCart, 'buyer_id')):
+        model.objects.bulk_create(
+            model(**{owner: user_id, 'recipe_id': recipe_id})
+            for user_id in users_ids
+            for recipe_id in rnd.sample(
+                recipes_ids, min(favorites, len(recipes_ids))))
+    Subscribes.objects.bulk_create(
+        Subscribes(user_id=user_id, following_id=following_id)
+        for user_id in users_ids
+        for following_id in rnd.sample(
+            users_ids, min(subscriptions + 1, len(users_ids)))
+        if following_id != user_id)
+    Recipe.objects.filter(id__in=recipes_ids).update(
+        **get_counters_subqueries())
+    ShoppingListItem.objects.filter(user_id__in=users_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=user_id, ingredients_id=ingredient_id,
+                         amount=amount)
+        for (user_id, ingredient_id), amount
+        in get_shopping_list_totals().items() if user_id in users_ids)
+    rebuild_cards(recipes_ids)
+    for user_id in users_ids:
+        rebuild_feed(user_id)
+    tags_reference.invalidate()
+    ingredients_reference.invalidate()
+    user = User.objects.get(id=users_ids[0])
+    user.set_password(PASSWORD)
+    user.save(update_fields=['password'])
+    return {
+        'user': user,
+        'token': Token.objects.get_or_create(user=user)[0].key,
+        'users': users_ids,
+        'recipes': recipes_ids,
+        'own_recipes': list(Recipe.objects.filter(
+            author=user).values_list('id', flat=True)),
+        'tags': list(Tags.objects.filter(
+            id__in=tags_ids).values_list('slug', flat=True)),
+        'ingredients': ingredients_ids,
+        'ingredients_per_recipe': ingredients_per_recipe,
+    }
+
+
+class Scenario:
+    """Запрос к одному endpoint'у с подготовкой и откатом изменений"""
+
+    def __init__(self, name, method, path, data=None, auth=True,
+                 prepare=None, cleanup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.auth = auth
+        self.prepare = prepare
+        self.cleanup = cleanup
+
+
+def toggle(model, present, **lookup):
+    """Подготовка и откат состояния связи до и после замера"""
+    def apply(response=None):
+        if present:
+            model.objects.get_or_create(**lookup)
+        else:
+            model.objects.filter(**lookup).delete()
+    return apply
+
+
+def toggle_many(model, present, owner, recipe_ids):
+    """Подготовка и откат связей пользователя с несколькими рецептами"""
+    def apply(response=None):
+        model.objects.filter(**owner, recipe_id__in=recipe_ids).delete()
+        if present:
+            model.objects.bulk_create(
+                model(**owner, recipe_id=recipe_id)
+                for recipe_id in recipe_ids)
+    return apply
+
+
+def get_scenarios(context):
+    user = context['user']
+    recipe_id = context['recipes'][-1]
+    author_id = context['users'][-1]
+    own_recipe = (context['own_recipes'] or context['recipes'])[0]
+    recipe_body = {
+        'name': f'{BENCHMARK_PREFIX} new', 'text': 'text',
+        'cooking_time': 5, 'image': IMAGE, 'tags': [],
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 10}
+            for ingredient_id in context['ingredients'][
+                :context['ingredients_per_recipe']]]}
+    recipe_body['tags'] = list(Tags.objects.filter(
+        slug__in=context['tags']).values_list('id', flat=True))
+
+    def delete_created(response):
+        recipe = Recipe.objects.get(id=response.data['id'])
+        recipe.image.delete(save=False)
+        recipe.delete()
+
+    favorite = {'user': user, 'recipe_id': recipe_id}
+    cart = {'buyer': user, 'recipe_id': recipe_id}
+    subscription = {'user': user, 'following_id': author_id}
+    bulk = {'recipes': context['recipes'][-50:]}
+
+    def restore_image(response=None):
+        recipe = Recipe.objects.get(id=own_recipe)
+        if recipe.image.name != 'photos/benchmark.png':
+            recipe.image.delete(save=False)
+            Recipe.objects.filter(id=own_recipe).update(
+                image='photos/benchmark.png')
+
+    def delete_user(response):
+        User.objects.filter(id=response.data['id']).delete()
+
+    tag = context['tags'][0]
+    return [
+        Scenario('recipes:list:anonymous', 'get', '/api/recipes/?limit=6',
+                 auth=False),
+        Scenario('recipes:list:anonymous:uncached', 'get',
+                 '/api/recipes/?limit=6', auth=False,
+                 prepare=invalidate_recipes),
+        Scenario('recipes:detail:anonymous', 'get',
+                 f'/api/recipes/{recipe_id}/', auth=False),
+        Scenario('recipes:list', 'get', '/api/recipes/?limit=6'),
+        Scenario('recipes:list:limit50', 'get', '/api/recipes/?limit=50'),
+        Scenario('recipes:list:deep_page', 'get',
+                 '/api/recipes/?limit=6&page=last'),
+        Scenario('recipes:list:cursor', 'get',
+                 '/api/recipes/?limit=6&cursor='),
+        Scenario('recipes:list:tags', 'get',
+                 f'/api/recipes/?limit=6&tags={tag}'),
+        Scenario('recipes:list:is_favorited', 'get',
+                 '/api/recipes/?limit=6&is_favorited=1'),
+        Scenario('recipes:list:popular', 'get',
+                 '/api/recipes/?limit=6&ordering=-favorites_count'),
+        Scenario('recipes:detail', 'get', f'/api/recipes/{recipe_id}/'),
+        Scenario('recipes:search', 'get',
+                 f'/api/recipes/search/?q={BENCHMARK_PREFIX}&limit=6'),
+        Scenario('recipes:feed', 'get', '/api/recipes/feed/?limit=6'),
+        Scenario('recipes:matching', 'get',
+                 '/api/recipes/matching/?limit=6&ingredients=' + ','.join(
+                     str(pk) for pk in context['ingredients'][:5])),
+        Scenario('recipes:create', 'post', '/api/recipes/', recipe_body,
+                 cleanup=delete_created),
+        Scenario('recipes:update', 'patch', f'/api/recipes/{own_recipe}/',
+                 recipe_body, cleanup=restore_image),
+        Scenario('recipes:favorite:add', 'post',
+                 f'/api/recipes/{recipe_id}/favorite/',
+                 prepare=toggle(Favorite, False, **favorite),
+                 cleanup=toggle(Favorite, False, **favorite)),
+        Scenario('recipes:favorite:remove', 'delete',
+                 f'/api/recipes/{recipe_id}/favorite/',
+                 prepare=toggle(Favorite, True, **favorite)),
+        Scenario('recipes:shopping_cart:add', 'post',
+                 f'/api/recipes/{recipe_id}/shopping_cart/',
+                 prepare=toggle(ShoppingCart, False, **cart),
+                 cleanup=toggle(ShoppingCart, False, **cart)),
+        Scenario('recipes:shopping_cart:remove', 'delete',
+                 f'/api/recipes/{recipe_id}/shopping_cart/',
+                 prepare=toggle(ShoppingCart, True, **cart)),
+        Scenario('recipes:favorite:bulk_add', 'post',
+                 '/api/recipes/favorite/bulk/', bulk,
+                 prepare=toggle_many(
+                     Favorite, False, {'user': user}, bulk['recipes']),
+                 cleanup=toggle_many(
+                     Favorite, False, {'user': user}, bulk['recipes'])),
+        Scenario('recipes:favorite:bulk_remove', 'delete',
+                 '/api/recipes/favorite/bulk/', bulk,
+                 prepare=toggle_many(
+                     Favorite, True, {'user': user}, bulk['recipes'])),
+        Scenario('recipes:shopping_cart:bulk_add', 'post',
+                 '/api/recipes/shopping_cart/bulk/', bulk,
+                 prepare=toggle_many(
+                     ShoppingCart, False, {'buyer': user}, bulk['recipes']),
+                 cleanup=toggle_many(
+                     ShoppingCart, False, {'buyer': user}, bulk['recipes'])),
+        Scenario('recipes:shopping_cart:bulk_remove', 'delete',
+                 '/api/recipes/shopping_cart/bulk/', bulk,
+                 prepare=toggle_many(
+                     ShoppingCart, True, {'buyer': user}, bulk['recipes'])),
+        Scenario('recipes:download_shopping_cart', 'get',
+                 '/api/recipes/download_shopping_cart/'),
+        Scenario('recipes:download_shopping_cart:csv', 'get',
+                 '/api/recipes/download_shopping_cart/?file_format=csv'),
+        Scenario('tags:list', 'get', '/api/tags/', auth=False),
+        Scenario('tags:detail', 'get',
+                 f'/api/tags/{recipe_body["tags"][0]}/', auth=False),
+        Scenario('ingredients:list', 'get', '/api/ingredients/', auth=False),
+        Scenario('ingredients:autocomplete', 'get',
+                 f'/api/ingredients/?name={BENCHMARK_PREFIX}', auth=False),
+        Scenario('ingredients:search', 'get',
+                 f'/api/ingredients/?search={BENCHMARK_PREFIX}',
+                 auth=False),
+        Scenario('ingredients:detail', 'get',
+                 f'/api/ingredients/{context["ingredients"][0]}/',
+                 auth=False),
+        Scenario('users:subscriptions', 'get',
+                 '/api/users/subscriptions/?limit=6&recipes_limit=3'),
+        Scenario('users:subscribe', 'post',
+                 f'/api/users/{author_id}/subscribe/',
+                 prepare=toggle(Subscribes, False, **subscription),
+                 cleanup=toggle(Subscribes, False, **subscription)),
+        Scenario('users:unsubscribe', 'delete',
+                 f'/api/users/{author_id}/subscribe/',
+                 prepare=toggle(Subscribes, True, **subscription)),
+        Scenario('users:list', 'get', '/api/users/?limit=6'),
+        Scenario('users:detail', 'get', f'/api/users/{author_id}/'),
+        Scenario('users:me', 'get', '/api/users/me/'),
+        Scenario('users:create', 'post', '/api/users/', {
+            'username': f'{BENCHMARK_PREFIX}-new',
+            'email': f'{BENCHMARK_PREFIX}-new@example.com',
+            'first_name': 'Bench', 'last_name': 'Mark',
+            'password': PASSWORD}, auth=False, cleanup=delete_user),
+        Scenario('auth:token:login', 'post', '/api/auth/token/login/', {
+            'email': user.email, 'password': PASSWORD}, auth=False),
+    ]
+
+
+def run_scenario(scenario, clients, iterations):
+    client = clients[scenario.auth]
+
+    def request():
+        if scenario.prepare:
+            scenario.prepare()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(
+                scenario.path, scenario.data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        if scenario.cleanup:
+            scenario.cleanup(response)
+        return response, len(queries), elapsed
+
+    request()
+    tracemalloc.start()
+    response, queries, _ = request()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    timings = [request()[2] for _ in range(iterations)]
+    return {
+        'status': response.status_code,
+        'queries': queries,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'alloc_kib': round(allocated / 1024, 1),
+    }
+
+
+def run_benchmark(context, iterations=20, only=None):
+    clients = {False: APIClient(), True: APIClient()}
+    clients[True].credentials(HTTP_AUTHORIZATION=f'Token {context["token"]}')
+    return {
+        scenario.name: run_scenario(scenario, clients, iterations)
+        for scenario in get_scenarios(context)
+        if not only or any(name in scenario.name for name in only)}
+
+
+def compare(results, baseline, max_slowdown=None):
+    """Регрессии относительно сохранённого результата: больше запросов
+    к базе или, если задан max_slowdown, p99 медленнее в разы"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: запросов {previous["queries"]} -> '
+                f'{result["queries"]}')
+        if (max_slowdown is not None
+                and result['p99_ms'] > previous['p99_ms'] * max_slowdown):
+            regressions.append(
+                f'{name}: p99 {previous["p99_ms"]} -> {result["p99_ms"]} мс')
+    return regressions
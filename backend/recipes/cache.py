@@ -0,0 +1,77 @@
+from functools import lru_cache
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Ingredients, ReferenceVersion, Tags
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class ReferenceData:
+    """Справочные данные в кэше Django под номером версии, который меняется
+    при каждом изменении справочника; в процессе хранятся последние версии.
+    Если кэш не общий для процессов (SHARED_CACHE), новая версия не дошла
+    бы через него до других воркеров, поэтому номер версии хранится
+    в базе (ReferenceVersion) и читается одним запросом по ключу"""
+
+    def __init__(self, name, loader, local_size=2):
+        self.name = name
+        self.loader = loader
+        self.version_key = f'reference:{name}:version'
+        self.get_data = lru_cache(maxsize=local_size)(self.load)
+
+    def load(self, version):
+        key = f'reference:{self.name}:{version}'
+        data = cache.get(key)
+        if data is None:
+            data = self.loader()
+            cache.set(key, data, REFERENCE_CACHE_TIMEOUT)
+        return data
+
+    def get_version(self):
+        if not settings.SHARED_CACHE:
+            version = ReferenceVersion.objects.filter(
+                name=self.name).values_list('version', flat=True).first()
+            if version is None:
+                version = ReferenceVersion.objects.get_or_create(
+                    name=self.name, defaults={'version': uuid4().hex}
+                )[0].version
+            return version
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key, version)
+        return version
+
+    def get(self):
+        """Версия и данные справочника: {id: запись}"""
+        version = self.get_version()
+        return version, self.get_data(version)
+
+    def invalidate(self):
+        if not settings.SHARED_CACHE:
+            ReferenceVersion.objects.update_or_create(
+                name=self.name, defaults={'version': uuid4().hex})
+        else:
+            cache.set(self.version_key, uuid4().hex, None)
+
+
+def load_tags():
+    return {
+        tag['id']: tag
+        for tag in Tags.objects.order_by('id').values(
+            'id', 'name', 'color', 'slug')}
+
+
+def load_ingredients():
+    return {
+        ingredient['id']: ingredient
+        for ingredient in Ingredients.objects.order_by('id').values(
+            'id', 'name', 'measurement_unit')}
+
+
+tags_reference = ReferenceData('tags', load_tags)
+ingredients_reference = ReferenceData('ingredients', load_ingredients)
@@ -0,0 +1,25 @@
+from django.db import transaction
+
+from .matching import record_changes
+from .models import RecipeCard
+from .search import index_recipes
+from .serializers import render_cards
+
+REBUILD_BATCH = 500
+
+
+@transaction.atomic
+def rebuild_cards(recipe_ids):
+    """Пересборка RecipeCard и поискового индекса рецептов в той же
+    транзакции, в которой они изменились; карточки удалённых рецептов
+    удаляются каскадом. Индекс ингридиентов узнаёт об изменениях
+    после коммита"""
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), REBUILD_BATCH):
+        batch = recipe_ids[start:start + REBUILD_BATCH]
+        cards = render_cards(batch)
+        RecipeCard.objects.filter(recipe_id__in=batch).delete()
+        RecipeCard.objects.bulk_create(
+            RecipeCard(recipe_id=pk, data=data) for pk, data in cards.items())
+        index_recipes(batch)
+    record_changes(recipe_ids)
@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
+from .models import FeedEntry, Recipe, Subscribes
+from .tasks import enqueue
+
+HEAVY_AUTHORS_KEY = 'feed:heavy_authors'
+LAST_HEAVY_AUTHORS_KEY = 'feed:heavy_authors:last'
+BACKFILL_AUTHORS_KEY = 'feed:backfill_authors'
+HEAVY_AUTHORS_TIMEOUT = 600
+FAN_OUT_BATCH = 1000
+
+
+def get_heavy_authors():
+    """Авторы, у которых подписчиков больше FEED_FANOUT_LIMIT: их рецепты
+    не раскладываются по лентам, а читаются из рецептов при запросе ленты.
+    Список пересчитывается раз в HEAVY_AUTHORS_TIMEOUT секунд; авторам,
+    которые из него выбыли, ленты подписчиков дополняются в фоне"""
+    authors = cache.get(HEAVY_AUTHORS_KEY)
+    if authors is None:
+        authors = set(Subscribes.objects.order_by().values(
+            'following'
+        ).annotate(
+            followers=Count('id')
+        ).filter(
+            followers__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('following', flat=True))
+        demoted = cache.get(LAST_HEAVY_AUTHORS_KEY, set()) - authors
+        cache.set(HEAVY_AUTHORS_KEY, authors, HEAVY_AUTHORS_TIMEOUT)
+        cache.set(LAST_HEAVY_AUTHORS_KEY, authors, None)
+        if demoted:
+            cache.set(BACKFILL_AUTHORS_KEY, get_backfill_authors() | demoted,
+                      None)
+            for author_id in demoted:
+                schedule_backfill(author_id)
+    return authors
+
+
+def get_backfill_authors():
+    """Выбывшие из авторов с большим числом подписчиков, чьи рецепты ещё
+    не разложены по лентам: до тех пор лента читает их из рецептов"""
+    return cache.get(BACKFILL_AUTHORS_KEY, set())
+
+
+def trim_feeds(user_ids):
+    """Оставляет в лентах пользователей FEED_MAX_LENGTH последних рецептов
+    одним запросом"""
+    ranked = FeedEntry.objects.filter(user_id__in=user_ids).annotate(
+        row_number=Window(
+            RowNumber(), partition_by=F('user_id'),
+            order_by=(F('pub_date').desc(), F('recipe_id').desc()))
+    ).order_by().values('id', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    quote = connection.ops.quote_name
+    FeedEntry.objects.filter(id__in=RawSQL(
+        f'SELECT {quote("id")} FROM ({sql}) ranked '
+        f'WHERE {quote("row_number")} > %s',
+        (*params, settings.FEED_MAX_LENGTH))).delete()
+
+
+def add_to_feeds(user_ids, recipes):
+    """Рецепты (id, id автора, дата публикации) в ленты пользователей.
+    Задача выполняется позже, чем её поставили, поэтому рецепт попадает
+    в ленту, только если подписка на автора ещё есть: подписки
+    блокируются в той же транзакции, и отписка либо уже удалила подписку,
+    либо дождётся вставки и удалит рецепты автора из ленты"""
+    user_ids = list(user_ids)
+    authors_ids = {author_id for _, author_id, _ in recipes}
+    for start in range(0, len(user_ids), FAN_OUT_BATCH):
+        batch = user_ids[start:start + FAN_OUT_BATCH]
+        with transaction.atomic():
+            subscriptions = set(Subscribes.objects.select_for_update().filter(
+                user_id__in=batch, following_id__in=authors_ids
+            ).values_list('user_id', 'following_id'))
+            FeedEntry.objects.bulk_create(
+                (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                           author_id=author_id, pub_date=pub_date)
+                 for user_id in batch
+                 for recipe_id, author_id, pub_date in recipes
+                 if (user_id, author_id) in subscriptions),
+                batch_size=FAN_OUT_BATCH, ignore_conflicts=True)
+            trim_feeds(batch)
+
+
+def fan_out_recipe(recipe_id):
+    """Задача очереди: новый рецепт в ленты подписчиков автора"""
+    recipe = Recipe.objects.filter(pk=recipe_id).values_list(
+        'id', 'author_id', 'pub_date').first()
+    if recipe is None or recipe[1] in get_heavy_authors():
+        return
+    add_to_feeds(
+        Subscribes.objects.filter(following_id=recipe[1]).order_by(
+            'user_id').values_list('user_id', flat=True),
+        [recipe])
+
+
+def schedule_fan_out(recipe_id):
+    """Рецепт раскладывается по лентам в фоне после коммита"""
+    transaction.on_commit(lambda: enqueue(fan_out_recipe, recipe_id))
+
+
+def fill_feed(user_id, author_id):
+    """Задача очереди: последние рецепты автора в ленту нового
+    подписчика"""
+    if author_id in get_heavy_authors():
+        return
+    add_to_feeds([user_id], list(Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date', '-id').values_list(
+        'id', 'author_id', 'pub_date')[:settings.FEED_MAX_LENGTH]))
+
+
+def schedule_fill_feed(user_id, author_id):
+    transaction.on_commit(lambda: enqueue(fill_feed, user_id, author_id))
+
+
+def backfill_author(author_id):
+    """Задача очереди: последние рецепты автора, у которого стало не больше
+    FEED_FANOUT_LIMIT подписчиков, в ленты всех его подписчиков — пока
+    подписчиков было больше, его рецепты по лентам не раскладывались"""
+    if author_id in get_heavy_authors():
+        return
+    recipes = list(Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date', '-id').values_list(
+        'id', 'author_id', 'pub_date')[:settings.FEED_MAX_LENGTH])
+    if recipes:
+        add_to_feeds(
+            Subscribes.objects.filter(following_id=author_id).order_by(
+                'user_id').values_list('user_id', flat=True),
+            recipes)
+    cache.set(BACKFILL_AUTHORS_KEY, get_backfill_authors() - {author_id},
+              None)
+
+
+def schedule_backfill(author_id):
+    transaction.on_commit(lambda: enqueue(backfill_author, author_id))
+
+
+def remove_from_feed(user_id, author_id):
+    """Рецепты автора из ленты отписавшегося пользователя"""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+@transaction.atomic
+def rebuild_feed(user_id):
+    """Лента пользователя заново из его подписок"""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    authors_ids = set(Subscribes.objects.filter(
+        user_id=user_id).values_list('following_id', flat=True))
+    add_to_feeds([user_id], list(Recipe.objects.filter(
+        author_id__in=authors_ids - get_heavy_authors()
+    ).order_by('-pub_date', '-id').values_list(
+        'id', 'author_id', 'pub_date')[:settings.FEED_MAX_LENGTH]))
+
+
+def get_feed_sources(user):
+    """Источники ленты для FeedPagination: записи ленты пользователя
+    и рецепты тех авторов с большим числом подписчиков (и ещё не
+    разложенных по лентам выбывших из них), на которых он подписан"""
+    sources = [
+        (FeedEntry.objects.filter(user=user), ('pub_date', 'recipe_id'))]
+    read_authors = get_heavy_authors() | get_backfill_authors()
+    if read_authors:
+        followed = list(Subscribes.objects.filter(
+            user=user, following_id__in=read_authors
+        ).values_list('following_id', flat=True))
+        if followed:
+            sources.append((
+                Recipe.objects.filter(author_id__in=followed),
+                ('pub_date', 'id')))
+    return sources
@@ -1,23 +1,97 @@
 from django.contrib.auth import get_user_model
 from django_filters import rest_framework
+from django_filters.widgets import QueryArrayWidget
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
 
+from .cache import tags_reference
 from .models import Recipe
 
 User = get_user_model()
 
+TAGS_MODES = (('any', 'any'), ('all', 'all'))
+
+
+def split_values(values):
+    """Значения параметра из ?tags=a&tags=b и ?tags=a,b без повторов
+    и пустых"""
+    return {
+        item.strip() for value in values for item in value.split(',')
+        if item.strip()}
+
+
+class TagsFilter(rest_framework.Filter):
+    """Рецепты с любым из тэгов (?tags=a&tags=b или ?tags=a,b), а при
+    tags_mode=all — со всеми. slug переводятся в id по справочнику тэгов
+    из кэша, а рецепты отбираются полусоединением id IN (рецепты тэга)
+    по индексу (tags_id, recipe_id) без JOIN, поэтому не повторяются
+    и DISTINCT не нужен"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', QueryArrayWidget)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, queryset, value):
+        slugs = split_values(value or ())
+        if not slugs:
+            return queryset
+        _, tags = tags_reference.get()
+        ids_by_slug = {tag['slug']: tag['id'] for tag in tags.values()}
+        tags_ids = {ids_by_slug[slug] for slug in slugs if slug in ids_by_slug}
+        recipe_tags = Recipe.tags.through.objects.order_by()
+        if self.parent.form.cleaned_data.get('tags_mode') == 'all':
+            if len(tags_ids) < len(slugs):
+                return queryset.none()
+            for tag_id in tags_ids:
+                queryset = queryset.filter(id__in=recipe_tags.filter(
+                    tags_id=tag_id).values('recipe_id'))
+            return queryset
+        if not tags_ids:
+            return queryset.none()
+        return queryset.filter(id__in=recipe_tags.filter(
+            tags_id__in=tags_ids).values('recipe_id'))
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """Сортировка ?ordering= с id последним полем, чтобы рецепты с равными
+    счётчиками не повторялись и не терялись между страницами. По курсору
+    рецепты идут в порядке курсора, и ordering вместе с cursor — ошибка"""
+    cursor_error_message = 'ordering не поддерживается вместе с cursor'
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params
+        if params.get(self.ordering_param):
+            cursor_param = getattr(
+                view.pagination_class, 'cursor_query_param', None)
+            if cursor_param and cursor_param in params:
+                raise ValidationError(
+                    {self.ordering_param: [self.cursor_error_message]})
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and params.get(self.ordering_param) and not any(
+                field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering = [*ordering, '-id']
+        return ordering
+
 
 class CustomFilter(rest_framework.FilterSet):
     author = rest_framework.ModelChoiceFilter(queryset=User.objects.all())
-    tags = rest_framework.AllValuesFilter(field_name='tags__slug')
+    tags = TagsFilter()
+    tags_mode = rest_framework.ChoiceFilter(
+        choices=TAGS_MODES, method='get_tags_mode')
     is_in_shopping_cart = rest_framework.BooleanFilter(
         method='get_is_in_shopping_cart')
     is_favorited = rest_framework.BooleanFilter(
         method='get_is_favorited')
 
     class Meta:
-        fields = ('author', 'tags', 'is_in_shopping_cart', 'is_favorited',)
+        fields = ('author', 'tags', 'tags_mode', 'is_in_shopping_cart',
+                  'is_favorited',)
         model = Recipe
 
+    def get_tags_mode(self, queryset, name, value):
+        """Режим применяется в фильтре tags"""
+        return queryset
+
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
             return queryset.filter(favorite__user=self.request.user)
@@ -0,0 +1,113 @@
+import base64
+import binascii
+import logging
+import os
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+IMAGE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+DECODE_CHUNK = 64 * 1024 * 4
+SPOOL_SIZE = 1024 * 1024
+IMAGE_VARIANTS = (
+    ('full', (1280, 1280)),
+    ('card', (480, 480)),
+    ('thumbnail', (160, 160)),
+)
+VARIANT_FORMATS = [('jpg', 'JPEG', {'quality': 82, 'optimize': True,
+                                    'progressive': True})]
+if features.check('webp'):
+    VARIANT_FORMATS.insert(0, ('webp', 'WEBP', {'quality': 80, 'method': 4}))
+
+
+class ImageError(ValueError):
+    pass
+
+
+def decode_base64(payload):
+    """Декодирует base64 по частям во временный файл, который остаётся
+    в памяти до SPOOL_SIZE байт"""
+    if len(payload) // 4 * 3 > MAX_IMAGE_SIZE:
+        raise ImageError(
+            f'Размер изображения больше {MAX_IMAGE_SIZE // 1024 // 1024} МБ')
+    file = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        for start in range(0, len(payload), DECODE_CHUNK):
+            file.write(base64.b64decode(
+                payload[start:start + DECODE_CHUNK], validate=True))
+    except (binascii.Error, ValueError):
+        file.close()
+        raise ImageError('Загрузите корректное изображение')
+    file.seek(0)
+    return file
+
+
+def inspect_image(file):
+    """Формат изображения по заголовку и проверка файла без декодирования
+    всех пикселей; возвращает расширение"""
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            width, height = image.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise ImageError('Слишком большое разрешение изображения')
+            image.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ImageError('Загрузите корректное изображение')
+    finally:
+        file.seek(0)
+    if image_format not in IMAGE_FORMATS:
+        raise ImageError(f'Формат {image_format} не поддерживается')
+    return IMAGE_FORMATS[image_format]
+
+
+def save_variants(name):
+    """Уменьшенные копии изображения во всех форматах
+    {вариант: {расширение: имя файла}}; каждая следующая копия
+    делается из предыдущей, а JPEG декодируется сразу в уменьшенном виде"""
+    stem = os.path.splitext(name)[0]
+    variants = {}
+    with default_storage.open(name) as source, Image.open(source) as image:
+        image.draft('RGB', IMAGE_VARIANTS[0][1])
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert(
+                'RGBA' if 'transparency' in image.info else 'RGB')
+        for variant, size in IMAGE_VARIANTS:
+            image.thumbnail(size)
+            variants[variant] = {}
+            for extension, image_format, options in VARIANT_FORMATS:
+                converted = image
+                if image_format == 'JPEG' and image.mode != 'RGB':
+                    converted = image.convert('RGB')
+                buffer = BytesIO()
+                converted.save(buffer, image_format, **options)
+                variants[variant][extension] = default_storage.save(
+                    f'{stem}_{variant}.{extension}',
+                    ContentFile(buffer.getvalue()))
+    return variants
+
+
+def process_recipe_image(recipe_id, name):
+    """Копии изображения рецепта; True, если они сохранены в рецепте.
+    Копии одного и того же файла делаются один раз; если пока они делались,
+    изображение заменили, копии остаются для cleanup_media"""
+    variants = Recipe.objects.filter(image=name).exclude(
+        image_variants={}).values_list('image_variants', flat=True).first()
+    if variants is None:
+        try:
+            variants = save_variants(name)
+        except (OSError, Image.DecompressionBombError):
+            logger.exception('Не удалось обработать изображение %s', name)
+            return False
+    return bool(Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants))
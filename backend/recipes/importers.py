@@ -0,0 +1,115 @@
+import codecs
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+from django.db import connection, transaction
+
+CHUNK_SIZE = 5000
+
+
+def read_csv(path, fields):
+    """Строки csv-файла без заголовка как словари с полями fields"""
+    with open(path, 'rb') as csv_file:
+        for row in csv.reader(codecs.iterdecode(csv_file, 'utf-8')):
+            if row:
+                yield dict(zip(fields, row))
+
+
+def read_json(path, fields, buffer_size=64 * 1024):
+    """Объекты из json-массива, читаемого с диска частями"""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as json_file:
+        buffer = json_file.read(buffer_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f'{path}: ожидается json-массив')
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                chunk = json_file.read(buffer_size)
+                if not chunk:
+                    raise
+                buffer += chunk
+                continue
+            yield {field: item[field] for field in fields}
+            buffer = buffer[end:]
+
+
+def read_rows(path, fields):
+    if str(path).endswith('.json'):
+        return read_json(path, fields)
+    return read_csv(path, fields)
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def copy_rows(model, fields, rows, chunk_size):
+    """Загрузка через COPY во временную таблицу и INSERT ... ON CONFLICT"""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(
+        quote(model._meta.get_field(field).column) for field in fields)
+    read = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE import_rows ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA')
+        for chunk in chunked(rows, chunk_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([row[field] for field in fields]
+                             for row in chunk)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY import_rows ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer)
+            read += len(chunk)
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT DISTINCT {columns} FROM import_rows '
+            f'ON CONFLICT DO NOTHING')
+        return read, cursor.rowcount
+
+
+def bulk_create_rows(model, fields, rows, chunk_size):
+    """Загрузка пачками через bulk_create с пропуском дубликатов"""
+    read = 0
+    before = model.objects.count()
+    for chunk in chunked(rows, chunk_size):
+        model.objects.bulk_create(
+            (model(**row) for row in chunk), ignore_conflicts=True)
+        read += len(chunk)
+    return read, model.objects.count() - before
+
+
+def import_rows(model, fields, rows, chunk_size=CHUNK_SIZE, use_copy=True):
+    """Идемпотентная загрузка строк в модель: дубликаты по уникальному
+    ключу модели пропускаются. Возвращает прочитанные и добавленные
+    строки и затраченное время"""
+    started = time.perf_counter()
+    with transaction.atomic():
+        if use_copy and connection.vendor == 'postgresql':
+            read, created = copy_rows(model, fields, rows, chunk_size)
+        else:
+            read, created = bulk_create_rows(model, fields, rows, chunk_size)
+    return read, created, time.perf_counter() - started
+
+
+def report(read, created, elapsed):
+    rate = read / elapsed if elapsed else read
+    return (f'прочитано {read}, добавлено {created}, '
+            f'{elapsed:.2f} с, {rate:.0f} строк/с')
@@ -0,0 +1,36 @@
+from bisect import bisect_left
+
+last_index = None
+
+
+def get_index(ingredients):
+    """Ингридиенты справочника, отсортированные по названию в нижнем
+    регистре; сортируются заново, только когда справочник сменился"""
+    global last_index
+    index = last_index
+    if index is None or index[0] is not ingredients:
+        items = sorted(
+            (ingredient['name'].lower(), ingredient['id'])
+            for ingredient in ingredients.values())
+        index = last_index = (
+            ingredients, [item[0] for item in items], items)
+    return index
+
+
+def search_ingredients(query, limit, ingredients):
+    """Автодополнение по справочнику ингридиентов: сначала совпадения
+    по началу названия, затем по вхождению"""
+    query = query.lower()
+    ingredients, keys, items = get_index(ingredients)
+    found = []
+    for position in range(bisect_left(keys, query), len(keys)):
+        if len(found) >= limit or not keys[position].startswith(query):
+            break
+        found.append(items[position])
+    if query and len(found) < limit:
+        for item in items:
+            if query in item[0] and not item[0].startswith(query):
+                found.append(item)
+                if len(found) >= limit:
+                    break
+    return [ingredients[id] for _, id in found]
@@ -1,10 +1,10 @@
-import codecs
-import csv
 import os
 
 from django.core.management.base import BaseCommand
 
 from foodgram.settings import BASE_DIR
+from recipes.cache import ingredients_reference
+from recipes.importers import CHUNK_SIZE, import_rows, read_rows, report
 from recipes.models import Ingredients
 
 
@@ -12,13 +12,20 @@ class Command(BaseCommand):
 
     help = 'Adding Ingredients'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=os.path.join(BASE_DIR, 'data/ingredients.csv'),
+            help='csv (name,measurement_unit) or json file')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Use bulk_create even on PostgreSQL')
+
     def handle(self, *args, **options):
-        with open(os.path.join(
-                  BASE_DIR, 'data/ingredients.csv'), 'rb')as csv_file:
-            csv_reader = csv.reader((
-                codecs.iterdecode(csv_file, 'utf-8')), delimiter=';')
-            for row in csv_reader:
-                row_split = row[0].split(',')
-                Ingredients.objects.create(
-                    name=row_split[0], measurement_unit=row_split[1])
-        print('Игридиенты добавлены')
+        fields = ('name', 'measurement_unit')
+        result = import_rows(
+            Ingredients, fields, read_rows(options['path'], fields),
+            chunk_size=options['chunk_size'],
+            use_copy=not options['no_copy'])
+        ingredients_reference.invalidate()
+        print(f'Игридиенты добавлены: {report(*result)}')
@@ -1,10 +1,10 @@
-import codecs
-import csv
 import os
 
 from django.core.management.base import BaseCommand
 
 from foodgram.settings import BASE_DIR
+from recipes.cache import tags_reference
+from recipes.importers import CHUNK_SIZE, import_rows, read_rows, report
 from recipes.models import Tags
 
 
@@ -12,13 +12,20 @@ class Command(BaseCommand):
 
     help = 'Adding tags'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=os.path.join(BASE_DIR, 'data/tags.csv'),
+            help='csv (name,color,slug) or json file')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Use bulk_create even on PostgreSQL')
+
     def handle(self, *args, **options):
-        with open(os.path.join(
-                  BASE_DIR, 'data/tags.csv'), 'rb')as csv_file:
-            csv_reader = csv.reader((
-                codecs.iterdecode(csv_file, 'utf-8')), delimiter=';')
-            for row in csv_reader:
-                row_split = row[0].split(',')
-                Tags.objects.create(
-                    name=row_split[0], color=row_split[1], slug=row_split[2])
-        print('Теги добавлены')
+        fields = ('name', 'color', 'slug')
+        result = import_rows(
+            Tags, fields, read_rows(options['path'], fields),
+            chunk_size=options['chunk_size'],
+            use_copy=not options['no_copy'])
+        tags_reference.invalidate()
+        print(f'Теги добавлены: {report(*result)}')
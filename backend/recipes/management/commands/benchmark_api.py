@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.benchmark import compare, run_benchmark, seed_dataset
+from recipes.cache import ingredients_reference, tags_reference
+from recipes.response_cache import invalidate_recipes
+
+
+class Command(BaseCommand):
+
+    help = 'Measuring queries, latency and allocations for every endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--subscriptions', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--only', nargs='*')
+        parser.add_argument('--output')
+        parser.add_argument('--baseline')
+        parser.add_argument('--max-slowdown', type=float)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не откатывать созданные для замеров данные')
+
+    def handle(self, *args, **options):
+        dataset = {
+            key: options[key] for key in (
+                'users', 'recipes', 'ingredients_per_recipe', 'favorites',
+                'subscriptions')}
+        try:
+            with transaction.atomic():
+                context = seed_dataset(seed=options['seed'], **dataset)
+                results = run_benchmark(
+                    context, options['iterations'], options['only'])
+                transaction.set_rollback(not options['keep'])
+        finally:
+            tags_reference.invalidate()
+            ingredients_reference.invalidate()
+            invalidate_recipes()
+        for name, result in results.items():
+            print(f'{name}: {result["status"]}, '
+                  f'запросов {result["queries"]}, '
+                  f'p50 {result["p50_ms"]:.2f} мс, '
+                  f'p99 {result["p99_ms"]:.2f} мс, '
+                  f'{result["alloc_kib"]} КиБ')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'dataset': dataset, 'endpoints': results},
+                          file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)['endpoints']
+            regressions = compare(results, baseline, options['max_slowdown'])
+            if regressions:
+                raise CommandError(
+                    'Регрессии относительно ' + options['baseline'] + ':\n'
+                    + '\n'.join(regressions))
+            print('Регрессий нет')
@@ -0,0 +1,120 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.benchmark import BENCHMARK_PREFIX, percentile
+from recipes.feed import HEAVY_AUTHORS_KEY, fan_out_recipe, rebuild_feed
+from recipes.models import FeedEntry, Recipe, Subscribes
+from recipes.response_cache import invalidate_recipes
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+
+    help = 'Comparing fan-out on write and fan-out on read for the feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--readers', type=int, default=5000)
+        parser.add_argument('--following', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=20,
+                            help='Рецептов у каждого автора')
+        parser.add_argument('--publish', type=int, default=50,
+                            help='Сколько новых рецептов разложить по лентам')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не откатывать созданные для замеров данные')
+
+    def seed(self, rnd, options):
+        """Авторы с рецептами и читатели, подписанные на случайных
+        авторов"""
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(username=f'{BENCHMARK_PREFIX}-feed{index}',
+                 email=f'{BENCHMARK_PREFIX}-feed{index}@example.com',
+                 password=password)
+            for index in range(options['authors'] + options['readers']))
+        users_ids = list(User.objects.filter(
+            username__startswith=f'{BENCHMARK_PREFIX}-feed'
+        ).order_by('id').values_list('id', flat=True))
+        authors_ids = users_ids[:options['authors']]
+        readers_ids = users_ids[options['authors']:]
+        Recipe.objects.bulk_create(
+            Recipe(author_id=author_id, name=BENCHMARK_PREFIX, text='text',
+                   image='photos/benchmark.png', cooking_time=10)
+            for author_id in rnd.sample(
+                authors_ids * options['recipes'],
+                len(authors_ids) * options['recipes']))
+        Subscribes.objects.bulk_create(
+            Subscribes(user_id=reader_id, following_id=author_id)
+            for reader_id in readers_ids
+            for author_id in rnd.sample(
+                authors_ids, min(options['following'], len(authors_ids))))
+        started = time.perf_counter()
+        for reader_id in readers_ids:
+            rebuild_feed(reader_id)
+        print(f'Ленты {len(readers_ids)} читателей собраны за '
+              f'{time.perf_counter() - started:.1f} с, записей '
+              f'{FeedEntry.objects.filter(user_id__in=readers_ids).count()}')
+        return authors_ids, readers_ids
+
+    def measure_write(self, rnd, authors_ids, count):
+        """Время раскладки одного нового рецепта по лентам подписчиков"""
+        timings = []
+        for author_id in rnd.sample(authors_ids, min(count,
+                                                     len(authors_ids))):
+            recipe = Recipe.objects.create(
+                author_id=author_id, name=BENCHMARK_PREFIX, text='text',
+                image='photos/benchmark.png', cooking_time=10)
+            started = time.perf_counter()
+            fan_out_recipe(recipe.pk)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), percentile(timings, 0.99)
+
+    def measure_read(self, rnd, readers_ids, count):
+        timings = []
+        client = APIClient()
+        for _ in range(count):
+            client.force_authenticate(
+                User.objects.get(id=rnd.choice(readers_ids)))
+            started = time.perf_counter()
+            response = client.get('/api/recipes/feed/', {'limit': 10})
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.content
+        return statistics.median(timings), percentile(timings, 0.99)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                cache.delete(HEAVY_AUTHORS_KEY)
+                authors_ids, readers_ids = self.seed(rnd, options)
+                p50, p99 = self.measure_write(
+                    rnd, authors_ids, options['publish'])
+                print(f'fan-out on write, публикация: p50 {p50:.2f} мс, '
+                      f'p99 {p99:.2f} мс на рецепт')
+                p50, p99 = self.measure_read(
+                    rnd, readers_ids, options['queries'])
+                print(f'fan-out on write, лента: p50 {p50:.2f} мс, '
+                      f'p99 {p99:.2f} мс')
+                with override_settings(FEED_FANOUT_LIMIT=0):
+                    cache.delete(HEAVY_AUTHORS_KEY)
+                    p50, p99 = self.measure_read(
+                        rnd, readers_ids, options['queries'])
+                print(f'fan-out on read, лента: p50 {p50:.2f} мс, '
+                      f'p99 {p99:.2f} мс')
+                transaction.set_rollback(not options['keep'])
+        finally:
+            cache.delete(HEAVY_AUTHORS_KEY)
+            invalidate_recipes()
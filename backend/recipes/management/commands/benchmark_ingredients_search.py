@@ -0,0 +1,43 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from recipes.benchmark import percentile
+from recipes.models import Ingredients
+
+
+class Command(BaseCommand):
+
+    help = 'Measuring ingredient search latency per keystroke'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def measure(self, client, param, prefixes):
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            client.get('/api/ingredients/', {param: prefix})
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), percentile(timings, 0.99)
+
+    def handle(self, *args, **options):
+        names = list(Ingredients.objects.values_list('name', flat=True))
+        if not names:
+            print('Нет ингридиентов, выполните add_ingredients')
+            return
+        random.seed(options['seed'])
+        words = random.sample(names, min(options['words'], len(names)))
+        prefixes = [
+            word[:length] for word in words
+            for length in range(1, len(word) + 1)]
+        client = Client()
+        client.get('/api/ingredients/?name=')
+        for title, param in (('autocomplete', 'name'), ('search', 'search')):
+            p50, p99 = self.measure(client, param, prefixes)
+            print(f'{title}: {len(prefixes)} нажатий, '
+                  f'p50 {p50:.2f} мс, p99 {p99:.2f} мс')
@@ -0,0 +1,123 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.test import Client
+
+from recipes.benchmark import BENCHMARK_PREFIX, percentile
+from recipes.models import Ingredients, Recipe, RecipeIngredients
+from recipes.response_cache import invalidate_recipes
+from recipes.search import index_recipes
+
+User = get_user_model()
+
+SYLLABLES = ('ка', 'ро', 'ли', 'мо', 'на', 'се', 'пу', 'ра', 'то', 'ви',
+             'же', 'лу', 'ба', 'гре', 'сто', 'кра', 'ша', 'ме', 'до', 'зу')
+
+
+class Command(BaseCommand):
+
+    help = 'Measuring full-text recipe search on synthetic recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--batch', type=int, default=10_000)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--skip-icontains', action='store_true',
+            help='Не замерять поиск через icontains для сравнения')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не откатывать созданные для замеров данные')
+
+    def seed(self, rnd, recipes, batch):
+        """Рецепты из случайных слов: название из 2-3 слов, описание
+        из 10-20 слов и 3 ингридиента; индекс строится пачками"""
+        vocabulary = sorted({
+            ''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4)))
+            for _ in range(3000)})
+        author = User.objects.create(
+            username=f'{BENCHMARK_PREFIX}-search',
+            email=f'{BENCHMARK_PREFIX}-search@example.com')
+        Ingredients.objects.bulk_create(
+            Ingredients(name=f'{word} {BENCHMARK_PREFIX}',
+                        measurement_unit='г')
+            for word in rnd.sample(vocabulary, 200))
+        ingredients_ids = list(Ingredients.objects.filter(
+            name__endswith=BENCHMARK_PREFIX).values_list('id', flat=True))
+        last_id = 0
+        started = time.perf_counter()
+        for start in range(0, recipes, batch):
+            Recipe.objects.bulk_create(
+                Recipe(author=author,
+                       name=' '.join(rnd.choices(
+                           vocabulary, k=rnd.randint(2, 3))),
+                       text=' '.join(rnd.choices(
+                           vocabulary, k=rnd.randint(10, 20))),
+                       image='photos/benchmark.png', cooking_time=10)
+                for _ in range(min(batch, recipes - start)))
+            recipes_ids = list(Recipe.objects.filter(
+                author=author, id__gt=last_id).values_list('id', flat=True))
+            last_id = max(recipes_ids)
+            RecipeIngredients.objects.bulk_create(
+                RecipeIngredients(recipe_id=recipe_id,
+                                  ingredients_id=ingredient_id, amount=1)
+                for recipe_id in recipes_ids
+                for ingredient_id in rnd.sample(ingredients_ids, 3))
+            index_recipes(recipes_ids)
+        print(f'Создано рецептов: {recipes} за '
+              f'{time.perf_counter() - started:.1f} с')
+        return vocabulary
+
+    def measure(self, queries, search):
+        timings = []
+        found = 0
+        for query in queries:
+            started = time.perf_counter()
+            found += search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return (statistics.median(timings), percentile(timings, 0.99),
+                found / len(queries))
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        client = Client()
+
+        def full_text(query):
+            response = client.get(
+                '/api/recipes/search/', {'q': query, 'limit': 10})
+            return response.json()['count']
+
+        def icontains(query):
+            queryset = Recipe.objects.filter(
+                Q(name__icontains=query) | Q(text__icontains=query)
+                | Q(ingredients__name__icontains=query)).distinct()
+            list(queryset.order_by('-pub_date')[:10])
+            return queryset.count()
+
+        try:
+            with transaction.atomic():
+                vocabulary = self.seed(
+                    rnd, options['recipes'], options['batch'])
+                queries = [
+                    rnd.choice(vocabulary) if kind == 0
+                    else rnd.choice(vocabulary)[:4] if kind == 1
+                    else ' '.join(rnd.sample(vocabulary, 2))
+                    for kind in (
+                        index % 3 for index in range(options['queries']))]
+                searches = [('full-text', full_text)]
+                if not options['skip_icontains']:
+                    searches.append(('icontains', icontains))
+                for title, search in searches:
+                    p50, p99, found = self.measure(queries, search)
+                    print(f'{title}: {len(queries)} запросов, '
+                          f'p50 {p50:.2f} мс, p99 {p99:.2f} мс, '
+                          f'в среднем найдено {found:.1f}')
+                transaction.set_rollback(not options['keep'])
+        finally:
+            invalidate_recipes()
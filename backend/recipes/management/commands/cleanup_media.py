@@ -0,0 +1,57 @@
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+
+    help = 'Deleting media files that no recipe refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='photos')
+        parser.add_argument(
+            '--grace-hours', type=int, default=24,
+            help='Keep unreferenced files changed more recently')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        references = Counter()
+        for image, variants in Recipe.objects.values_list(
+                'image', 'image_variants').iterator():
+            references[image] += 1
+            for files in variants.values():
+                references.update(files.values())
+        if not default_storage.exists(options['path']):
+            print('Каталог не найден')
+            return
+        deadline = timezone.now() - timedelta(hours=options['grace_hours'])
+        files = deleted = freed = 0
+        for name in walk(default_storage, options['path']):
+            files += 1
+            if name in references:
+                continue
+            if default_storage.get_modified_time(name) > deadline:
+                continue
+            deleted += 1
+            freed += default_storage.size(name)
+            if not options['dry_run']:
+                default_storage.delete(name)
+        shared = sum(1 for count in references.values() if count > 1)
+        print(f'Файлов: {files}, используются несколькими рецептами: '
+              f'{shared}')
+        print(f'{"Будет удалено" if options["dry_run"] else "Удалено"}: '
+              f'{deleted} ({freed / 1024 / 1024:.1f} МБ)')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.services import process_image
+
+
+class Command(BaseCommand):
+
+    help = 'Making resized copies of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Remake copies for recipes that already have them')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if options['all']:
+            recipes.update(image_variants={})
+        else:
+            recipes = recipes.filter(image_variants={})
+        processed = 0
+        for recipe_id, name in recipes.values_list('id', 'image').iterator():
+            process_image(recipe_id, name)
+            processed += 1
+        print(f'Обработано изображений: {processed}')
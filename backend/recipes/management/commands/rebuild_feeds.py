@@ -0,0 +1,18 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from recipes.feed import HEAVY_AUTHORS_KEY, rebuild_feed
+from recipes.models import Subscribes
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuilding subscription feeds from subscriptions'
+
+    def handle(self, *args, **options):
+        cache.delete(HEAVY_AUTHORS_KEY)
+        users_ids = Subscribes.objects.order_by('user_id').values_list(
+            'user_id', flat=True).distinct()
+        for user_id in users_ids:
+            rebuild_feed(user_id)
+        print(f'Лент подписок пересобрано: {len(users_ids)}')
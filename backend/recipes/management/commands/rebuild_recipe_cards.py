@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.cards import REBUILD_BATCH, rebuild_cards
+from recipes.models import Recipe, RecipeCard
+from recipes.response_cache import invalidate_recipes
+from recipes.search import index_recipes
+from recipes.serializers import render_cards
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuilding or checking denormalized recipe cards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare stored cards with recipes')
+        parser.add_argument(
+            '--search', action='store_true',
+            help='Also rebuild the full-text search index of all recipes')
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True))
+        if options['search']:
+            for start in range(0, len(recipe_ids), REBUILD_BATCH):
+                index_recipes(recipe_ids[start:start + REBUILD_BATCH])
+            print('Поисковый индекс пересобран')
+        missing, stale = [], []
+        for start in range(0, len(recipe_ids), REBUILD_BATCH):
+            batch = recipe_ids[start:start + REBUILD_BATCH]
+            stored = dict(RecipeCard.objects.filter(
+                recipe_id__in=batch).values_list('recipe_id', 'data'))
+            for pk, card in render_cards(batch).items():
+                if pk not in stored:
+                    missing.append(pk)
+                elif stored[pk] != card:
+                    stale.append(pk)
+        print(f'Карточек рецептов: нет {len(missing)}, '
+              f'устарели {len(stale)}')
+        if not missing and not stale:
+            return
+        if options['check']:
+            raise CommandError('Карточки рецептов не совпадают с рецептами')
+        rebuild_cards(missing + stale)
+        invalidate_recipes(missing + stale)
+        print('Карточки рецептов пересобраны')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from recipes.shopping_list import get_shopping_list_totals
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuilding or checking shopping list totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare stored totals with shopping carts')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = get_shopping_list_totals()
+            stored = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount in
+                ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredients_id', 'amount').iterator()}
+            mismatched = {
+                key for key in expected.keys() | stored.keys()
+                if expected.get(key) != stored.get(key)}
+            print(f'Расхождений в списках покупок: {len(mismatched)}')
+            if not mismatched:
+                return
+            if options['check']:
+                raise CommandError('Списки покупок не совпадают с корзинами')
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create((
+                ShoppingListItem(
+                    user_id=user_id, ingredients_id=ingredient_id,
+                    amount=amount)
+                for (user_id, ingredient_id), amount in expected.items()),
+                batch_size=1000)
+        print('Списки покупок пересобраны')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from recipes.models import Recipe
+from recipes.services import get_counters_subqueries
+
+
+class Command(BaseCommand):
+
+    help = 'Reconciling recipe favorites and shopping cart counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare counters with favorites and carts')
+
+    def handle(self, *args, **options):
+        counters = get_counters_subqueries()
+        mismatched = Recipe.objects.annotate(**{
+            f'actual_{field}': value for field, value in counters.items()
+        }).exclude(**{
+            field: F(f'actual_{field}') for field in counters})
+        mismatched_ids = list(mismatched.values_list('id', flat=True))
+        print(f'Рецептов с неверными счётчиками: {len(mismatched_ids)}')
+        if not mismatched_ids:
+            return
+        if options['check']:
+            raise CommandError('Счётчики рецептов не совпадают')
+        Recipe.objects.filter(id__in=mismatched_ids).update(**counters)
+        print('Счётчики рецептов исправлены')
@@ -0,0 +1,193 @@
+import threading
+from array import array
+from collections import Counter
+from itertools import compress
+from operator import neg, sub
+
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import IngredientsChange, RecipeIngredients
+
+MAX_CHANGES_BEHIND = 1000
+MAX_OVERLAY = 20000
+MAX_INGREDIENTS = 50
+CHANGES_KEPT = 100000
+PRUNE_EVERY = 1000
+# Ключ pg_advisory_xact_lock, под которым пишется журнал
+CHANGES_LOCK = 0x6d61746368
+
+
+def get_last_change():
+    return IngredientsChange.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+@transaction.atomic
+def record_changes(recipe_ids):
+    """Журнал изменений наборов ингридиентов в базе, в транзакции
+    изменения. На PostgreSQL записи журнала делаются под блокировкой до
+    конца транзакции, поэтому номера записей растут в порядке коммитов,
+    и процесс, прочитавший запись, уже не пропустит более раннюю;
+    SQLite и так пишет по одной транзакции. Журнал хранит последние
+    CHANGES_KEPT записей"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_advisory_xact_lock(%s)', [CHANGES_LOCK])
+    IngredientsChange.objects.bulk_create(
+        IngredientsChange(recipe_id=pk) for pk in recipe_ids)
+    last = get_last_change()
+    if last % PRUNE_EVERY < len(recipe_ids):
+        IngredientsChange.objects.filter(
+            id__lte=last - CHANGES_KEPT).delete()
+
+
+class IngredientIndex:
+    """Обратный индекс ингридиент -> рецепты в памяти процесса. Полная
+    загрузка делается один раз, дальше изменения из журнала
+    IngredientsChange лежат поверх неё, пока их не станет больше
+    MAX_OVERLAY"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sequence = None
+        self.state = None
+
+    def load(self):
+        postings = {}
+        totals = Counter()
+        rows = RecipeIngredients.objects.order_by().values_list(
+            'recipe_id', 'ingredients_id')
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=20000):
+            postings.setdefault(ingredient_id, array('i')).append(recipe_id)
+            totals[recipe_id] += 1
+        return postings, {}, dict(totals)
+
+    def reload(self):
+        # Номер журнала читается до загрузки: изменения, сделанные во время
+        # неё, применятся ещё раз, а это ничего не меняет
+        self.sequence = get_last_change()
+        self.state = self.load()
+        return self.state
+
+    def sync(self):
+        """Индекс с изменениями из журнала: запрос к журналу по первичному
+        ключу и, если рецепты менялись, чтение только их ингридиентов"""
+        with self.lock:
+            if self.state is None:
+                return self.reload()
+            changes = list(IngredientsChange.objects.filter(
+                id__gt=self.sequence
+            ).order_by('id').values_list(
+                'id', 'recipe_id')[:MAX_CHANGES_BEHIND + 1])
+            if not changes:
+                return self.state
+            changed = {recipe_id for _, recipe_id in changes}
+            postings, overlay, totals = self.state
+            if (len(changes) > MAX_CHANGES_BEHIND
+                    or len(overlay) + len(changed) > MAX_OVERLAY):
+                return self.reload()
+            overlay = {**overlay, **{
+                recipe_id: set() for recipe_id in changed}}
+            for recipe_id, ingredient_id in (
+                    RecipeIngredients.objects.filter(
+                        recipe_id__in=changed).values_list(
+                            'recipe_id', 'ingredients_id')):
+                overlay[recipe_id].add(ingredient_id)
+            totals = {**totals, **{
+                recipe_id: len(ingredients)
+                for recipe_id, ingredients in overlay.items()}}
+            self.state = postings, overlay, totals
+            self.sequence = changes[-1][0]
+            return self.state
+
+    def match(self, ingredient_ids):
+        """Совпадения {id рецепта: число имеющихся ингридиентов}
+        и число ингридиентов каждого рецепта"""
+        postings, overlay, totals = self.sync()
+        ingredient_ids = set(ingredient_ids)
+        matched = Counter()
+        for ingredient_id in ingredient_ids:
+            matched.update(postings.get(ingredient_id, ()))
+        for recipe_id, ingredients in overlay.items():
+            count = len(ingredients & ingredient_ids)
+            if count:
+                matched[recipe_id] = count
+            else:
+                matched.pop(recipe_id, None)
+        return matched, totals
+
+
+ingredient_index = IngredientIndex()
+
+
+class MatchResults:
+    """Рецепты, в которых есть хотя бы один из ингридиентов: сначала те,
+    для которых есть все ингридиенты, затем по числу недостающих;
+    как QuerySet, поддерживает count() и срезы для пагинации. Сортируется
+    только та часть рецептов, которая нужна для запрошенной страницы"""
+    ordered = True
+
+    def __init__(self, queryset, ingredient_ids):
+        self.queryset = queryset
+        matched, totals = ingredient_index.match(ingredient_ids)
+        self.recipes = list(matched)
+        self.matched = list(matched.values())
+        self.missing = list(map(
+            sub, map(totals.__getitem__, self.recipes), self.matched))
+
+    def count(self):
+        return len(self.recipes)
+
+    def get_threshold(self, needed):
+        """Наибольшее число недостающих ингридиентов среди первых
+        needed рецептов выдачи"""
+        histogram = Counter(self.missing)
+        total = 0
+        for missing in sorted(histogram):
+            total += histogram[missing]
+            if total >= needed:
+                return missing
+        return max(histogram, default=0)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step:
+            raise TypeError('Поддерживаются только срезы')
+        start = index.start or 0
+        stop = len(self.recipes) if index.stop is None else index.stop
+        if stop <= start:
+            return []
+        mask = list(map(self.get_threshold(stop).__ge__, self.missing))
+        ranked = sorted(zip(
+            compress(self.missing, mask),
+            map(neg, compress(self.matched, mask)),
+            map(neg, compress(self.recipes, mask))))[start:stop]
+        recipes = self.queryset.in_bulk(
+            [-recipe_id for *_, recipe_id in ranked])
+        page = []
+        for missing, _, recipe_id in ranked:
+            recipe = recipes.get(-recipe_id)
+            if recipe is not None:
+                recipe.missing = missing
+                page.append(recipe)
+        return page
+
+
+def parse_ingredient_ids(values):
+    """id ингридиентов из ?ingredients=1,2&ingredients=3; None, если
+    среди них есть не числа или их больше MAX_INGREDIENTS"""
+    ids = set()
+    for value in values:
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if not item.isdecimal():
+                return None
+            ids.add(int(item))
+    if len(ids) > MAX_INGREDIENTS:
+        return None
+    return ids
@@ -0,0 +1,391 @@
+import asyncio
+import bisect
+import glob
+import logging
+import os
+import pickle
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+FLUSH_INTERVAL = 1
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+current_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Запросы к базе и время сериализации одного HTTP-запроса;
+    экземпляр подключается к соединению через connection.execute_wrapper"""
+
+    def __init__(self, detailed=True):
+        self.detailed = detailed
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            if self.detailed:
+                self.fingerprints[IN_LIST.sub('IN (...)', sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Запросы, выполненные больше одного раза: признак N+1"""
+        return {
+            sql: count for sql, count in self.fingerprints.items()
+            if count > 1}
+
+    def get_server_timing(self, duration):
+        duplicates = sum(count - 1 for count in self.duplicates.values())
+        timings = [
+            f'db;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.queries} queries, {duplicates} duplicated"']
+        if self.detailed:
+            timings.append(f'serializer;dur={self.serializer_time * 1000:.1f}')
+        timings.append(f'total;dur={duration * 1000:.1f}')
+        return ', '.join(timings)
+
+
+class TimedSerializerMixin:
+    """Время to_representation сериализатора верхнего уровня (вместе
+    с вложенными и их запросами) попадает в метрики текущего запроса"""
+
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None or not metrics.detailed or metrics.serializer_depth:
+            return super().to_representation(instance)
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - started
+            metrics.serializer_depth -= 1
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def format_labels(**labels):
+    return ','.join(
+        f'{name}="{escape_label(value)}"' for name, value in labels.items())
+
+
+class MetricsRegistry:
+    """Метрики, накопленные процессом. Если задан каталог
+    REQUEST_METRICS['DIR'], каждый воркер gunicorn через FLUSH_INTERVAL
+    секунд после запроса и при выходе записывает в него свой файл,
+    а collect() складывает файлы всех воркеров, в том числе перезапущенных,
+    поэтому счётчики в /api/_metrics не зависят от того, какой воркер
+    ответил, и не уменьшаются"""
+    COUNTERS = ('requests', 'duration', 'sampled', 'queries', 'sql_time',
+                'serializer_time', 'duplicated')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pid = self.name = None
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self.duration = Counter()
+        self.sampled = Counter()
+        self.queries = Counter()
+        self.sql_time = Counter()
+        self.serializer_time = Counter()
+        self.duplicated = Counter()
+        self.duplicate_sql = defaultdict(Counter)
+        self.timer = None
+
+    def get_state(self):
+        state = {name: dict(getattr(self, name)) for name in self.COUNTERS}
+        state['buckets'] = dict(self.buckets)
+        state['duplicate_sql'] = {
+            key: dict(sqls) for key, sqls in self.duplicate_sql.items()}
+        return state
+
+    def merge(self, state):
+        for name in self.COUNTERS:
+            getattr(self, name).update(state[name])
+        for key, counts in state['buckets'].items():
+            self.buckets[key] = [
+                total + count
+                for total, count in zip(self.buckets[key], counts)]
+        for key, sqls in state['duplicate_sql'].items():
+            for sql, count in sqls.items():
+                self.duplicate_sql[key][sql] = max(
+                    count, self.duplicate_sql[key][sql])
+
+    def get_path(self, directory):
+        """Файл процесса: после fork воркер начинает свой, с уникальным
+        именем, чтобы не затереть файл завершившегося воркера с тем же pid"""
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    if self.pid is not None:
+                        self.reset()
+                    self.pid = os.getpid()
+                    self.name = f'{self.pid}-{uuid4().hex}.pickle'
+        return os.path.join(directory, self.name)
+
+    def flush(self):
+        """Метрики процесса в его файл в каталоге DIR"""
+        directory = settings.REQUEST_METRICS.get('DIR')
+        if not directory:
+            return
+        with self.flush_lock:
+            path = self.get_path(directory)
+            with self.lock:
+                data = pickle.dumps(self.get_state())
+                self.timer = None
+            try:
+                os.makedirs(directory, exist_ok=True)
+                with open(f'{path}.tmp', 'wb') as file:
+                    file.write(data)
+                os.replace(f'{path}.tmp', path)
+            except OSError:
+                logger.exception('Не удалось записать метрики в %s', path)
+
+    def collect(self):
+        """Метрики всех воркеров из каталога DIR, без него — этого
+        процесса"""
+        directory = settings.REQUEST_METRICS.get('DIR')
+        if not directory:
+            return self
+        self.flush()
+        total = MetricsRegistry()
+        for path in glob.glob(os.path.join(directory, '*.pickle')):
+            try:
+                with open(path, 'rb') as file:
+                    total.merge(pickle.load(file))
+            except (OSError, EOFError, pickle.UnpicklingError):
+                logger.warning('Не удалось прочитать метрики из %s', path)
+        return total
+
+    def observe(self, view, method, status, duration, metrics=None):
+        key = (view, method)
+        with self.lock:
+            self.requests[key + (status,)] += 1
+            self.buckets[key][
+                bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+            self.duration[key] += duration
+            if metrics is not None:
+                self.sampled[key] += 1
+                self.queries[key] += metrics.queries
+                self.sql_time[key] += metrics.sql_time
+                self.serializer_time[key] += metrics.serializer_time
+                for sql, count in metrics.duplicates.items():
+                    self.duplicated[key] += count - 1
+                    self.duplicate_sql[key][sql] = max(
+                        count, self.duplicate_sql[key][sql])
+            if self.timer is None and settings.REQUEST_METRICS.get('DIR'):
+                self.timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+
+        def metric(name, kind, help_text, values):
+            lines.append(f'# HELP foodgram_{name} {help_text}')
+            lines.append(f'# TYPE foodgram_{name} {kind}')
+            for (view, method), value in sorted(values.items()):
+                labels = format_labels(view=view, method=method)
+                lines.append(f'foodgram_{name}{{{labels}}} {value}')
+
+        with self.lock:
+            lines.append('# HELP foodgram_http_requests_total '
+                         'Handled requests')
+            lines.append('# TYPE foodgram_http_requests_total counter')
+            for (view, method, status), value in sorted(
+                    self.requests.items()):
+                labels = format_labels(
+                    view=view, method=method, status=status)
+                lines.append(
+                    f'foodgram_http_requests_total{{{labels}}} {value}')
+            name = 'foodgram_http_request_duration_seconds'
+            lines.append(f'# HELP {name} Request duration')
+            lines.append(f'# TYPE {name} histogram')
+            for (view, method), counts in sorted(self.buckets.items()):
+                total = 0
+                for bound, count in zip(
+                        DURATION_BUCKETS + ('+Inf',), counts):
+                    total += count
+                    labels = format_labels(view=view, method=method, le=bound)
+                    lines.append(f'{name}_bucket{{{labels}}} {total}')
+                labels = format_labels(view=view, method=method)
+                lines.append(
+                    f'{name}_sum{{{labels}}} {self.duration[(view, method)]}')
+                lines.append(f'{name}_count{{{labels}}} {total}')
+            metric('sampled_requests_total', 'counter',
+                   'Requests with database and serializer metrics',
+                   self.sampled)
+            metric('db_queries_total', 'counter',
+                   'Database queries in sampled requests', self.queries)
+            metric('db_seconds_total', 'counter',
+                   'Database time in sampled requests', self.sql_time)
+            metric('serializer_seconds_total', 'counter',
+                   'Serializer time in sampled requests',
+                   self.serializer_time)
+            metric('db_duplicate_queries_total', 'counter',
+                   'Repeated identical queries in sampled requests',
+                   self.duplicated)
+        return '\n'.join(lines) + '\n'
+
+    def report(self, limit=3):
+        """Endpoint'ы по убыванию среднего времени ответа, с числом запросов
+        к базе и самыми частыми повторяющимися запросами"""
+        with self.lock:
+            rows = []
+            for key, duration in self.duration.items():
+                count = sum(self.buckets[key])
+                sampled = self.sampled[key] or 1
+                rows.append((duration / count, key, count, sampled))
+            rows.sort(reverse=True)
+            lines = []
+            for average, (view, method), count, sampled in rows:
+                lines.append(
+                    f'{method} {view}: {count} запросов, '
+                    f'в среднем {average * 1000:.1f} мс, '
+                    f'SQL {self.sql_time[(view, method)] / sampled * 1000:.1f}'
+                    f' мс, {self.queries[(view, method)] / sampled:.1f} '
+                    f'запросов к базе')
+                for sql, repeats in self.duplicate_sql[
+                        (view, method)].most_common(limit):
+                    lines.append(f'    x{repeats} {sql}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """Число и время запросов к базе, повторы запросов и время сериализации
+    для доли запросов SAMPLE_RATE: в заголовке Server-Timing и в /api/_metrics.
+    В режиме LOW_OVERHEAD считаются только число и время запросов к базе.
+    Под ASGI считаются запросы к базе из recipes.async_views.in_thread"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = settings.REQUEST_METRICS
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = options['SAMPLE_RATE']
+        self.detailed = not options['LOW_OVERHEAD']
+        self.slow_request = options['SLOW_REQUEST_MS'] / 1000
+        self.duplicates_threshold = options['DUPLICATE_QUERIES']
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def sample(self):
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            return RequestMetrics(self.detailed)
+        return None
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        metrics = self.sample()
+        if metrics is None:
+            response = self.get_response(request)
+        else:
+            token = current_metrics.set(metrics)
+            try:
+                with connection.execute_wrapper(metrics):
+                    response = self.get_response(request)
+            finally:
+                current_metrics.reset(token)
+        return self.finish(request, response, started, metrics)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        metrics = self.sample()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, started, metrics)
+
+    def finish(self, request, response, started, metrics):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.observe(
+            view, request.method, response.status_code, duration, metrics)
+        if metrics is not None:
+            response['Server-Timing'] = metrics.get_server_timing(duration)
+            self.log(request, duration, metrics)
+        return response
+
+    def log(self, request, duration, metrics):
+        duplicates = metrics.duplicates
+        if (duration < self.slow_request and max(
+                duplicates.values(), default=0) < self.duplicates_threshold):
+            return
+        logger.warning(
+            '%s %s: %.1f мс, запросов к базе %d (%.1f мс), повторы: %s',
+            request.method, request.path, duration * 1000, metrics.queries,
+            metrics.sql_time * 1000,
+            '; '.join(
+                f'x{count} {sql}' for sql, count in sorted(
+                    duplicates.items(), key=lambda item: -item[1])[:3]))
+
+
+def can_read_metrics(request):
+    """Метрики читает сборщик с заголовком Authorization: Bearer
+    REQUEST_METRICS_TOKEN или администратор со своим токеном"""
+    token = settings.REQUEST_METRICS['TOKEN']
+    header = request.headers.get('Authorization', '')
+    if token and constant_time_compare(header, f'Bearer {token}'):
+        return True
+    try:
+        credentials = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return credentials is not None and credentials[0].is_staff
+
+
+def metrics_view(request):
+    """Метрики всех воркеров для Prometheus, с ?format=report — отчёт
+    о медленных endpoint'ах"""
+    if not can_read_metrics(request):
+        return HttpResponseForbidden()
+    metrics = registry.collect()
+    if request.GET.get('format') == 'report':
+        return HttpResponse(
+            metrics.report(), content_type='text/plain; charset=utf-8')
+    return HttpResponse(
+        metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+
+def is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+def drop_invalid_index(schema_editor, name):
+    """Индекс, который остался невалидным после прерванного CREATE INDEX
+    CONCURRENTLY: IF NOT EXISTS принял бы его за построенный"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index JOIN pg_class '
+            'ON pg_class.oid = pg_index.indexrelid '
+            'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid '
+            'AND pg_table_is_visible(pg_class.oid)', [name])
+        invalid = cursor.fetchone() is not None
+    if invalid:
+        schema_editor.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS '
+            f'{schema_editor.quote_name(name)}')
+
+
+def create_index(schema_editor, model, index):
+    """На PostgreSQL индекс строится CONCURRENTLY, без блокировки записи
+    в таблицу, поэтому миграция должна быть с atomic = False; повторный
+    запуск после сбоя достраивает индекс заново"""
+    sql = str(index.create_sql(model, schema_editor))
+    if is_postgresql(schema_editor):
+        drop_invalid_index(schema_editor, index.name)
+        sql = sql.replace(
+            'CREATE INDEX', 'CREATE INDEX CONCURRENTLY IF NOT EXISTS', 1)
+    schema_editor.execute(sql)
+
+
+def drop_index(schema_editor, model, index):
+    if is_postgresql(schema_editor):
+        schema_editor.execute(
+            'DROP INDEX CONCURRENTLY IF EXISTS '
+            f'{schema_editor.quote_name(index.name)}')
+    else:
+        schema_editor.remove_index(model, index)
+
+
+def add_index_concurrently(model_name, index, app_label='recipes'):
+    """migrations.AddIndex, который на PostgreSQL строит индекс
+    CONCURRENTLY"""
+
+    def forwards(apps, schema_editor):
+        create_index(
+            schema_editor, apps.get_model(app_label, model_name), index)
+
+    def backwards(apps, schema_editor):
+        drop_index(
+            schema_editor, apps.get_model(app_label, model_name), index)
+
+    return migrations.SeparateDatabaseAndState(
+        database_operations=[migrations.RunPython(forwards, backwards)],
+        state_operations=[
+            migrations.AddIndex(model_name=model_name, index=index)],
+    )
@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+from recipes.migration_indexes import add_index_concurrently
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ('-pub_date', '-id')},
+        ),
+        add_index_concurrently('recipe', models.Index(
+            fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx')),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-18 20:19
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredients = apps.get_model('recipes', 'Ingredients')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredients.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        count=models.Count('id'), keep=models.Min('id')
+    ).filter(count__gt=1)
+    for group in duplicates.iterator():
+        ingredients_ids = list(Ingredients.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).values_list('id', flat=True))
+        for model, owner in ((RecipeIngredients, 'recipe_id'),
+                             (ShoppingListItem, 'user_id')):
+            rows = model.objects.filter(ingredients_id__in=ingredients_ids)
+            amounts = defaultdict(int)
+            for row in rows:
+                amounts[getattr(row, owner)] += row.amount
+            rows.delete()
+            model.objects.bulk_create(
+                model(**{owner: owner_id, 'ingredients_id': group['keep'],
+                         'amount': amount})
+                for owner_id, amount in amounts.items())
+        Ingredients.objects.filter(id__in=ingredients_ids).exclude(
+            id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+# Ограничение добавляется отдельной миграцией, в своей транзакции:
+# в PostgreSQL ALTER TABLE в одной транзакции с удалением дублей падает
+# с "pending trigger events" из-за отложенных проверок внешних ключей
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_merge_duplicate_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredients',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='ingredients_unique'),
+        ),
+    ]
@@ -0,0 +1,139 @@
+# Generated by Django 3.2 on 2026-10-18 20:21
+
+from django.db import migrations, models, transaction
+from django.db.models.functions import Coalesce
+
+from recipes.migration_indexes import drop_invalid_index, is_postgresql
+
+UNIQUE_CONSTRAINTS = (
+    ('Favorite', 'user', models.UniqueConstraint(
+        fields=('user', 'recipe'), name='unique_favorite')),
+    ('ShoppingCart', 'buyer', models.UniqueConstraint(
+        fields=('buyer', 'recipe'), name='unique_shopping_cart')),
+)
+TAGS_INDEX = 'recipe_tags_tags_recipe_idx'
+
+
+def delete_duplicates(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    with transaction.atomic():
+        recipes_ids, buyers_ids = set(), set()
+        for model_name, owner, _ in UNIQUE_CONSTRAINTS:
+            model = apps.get_model('recipes', model_name)
+            duplicates = model.objects.values(owner, 'recipe').annotate(
+                count=models.Count('id'), keep=models.Min('id')
+            ).filter(count__gt=1)
+            for group in duplicates:
+                model.objects.filter(
+                    **{owner: group[owner], 'recipe': group['recipe']}
+                ).exclude(id=group['keep']).delete()
+                recipes_ids.add(group['recipe'])
+                if model is ShoppingCart:
+                    buyers_ids.add(group[owner])
+        Recipe.objects.filter(id__in=recipes_ids).update(**{
+            field: Coalesce(models.Subquery(
+                model.objects.filter(
+                    recipe=models.OuterRef('pk')
+                ).order_by().values('recipe').annotate(
+                    count=models.Count('id')
+                ).values('count')), 0)
+            for field, model in (
+                ('favorites_count', apps.get_model('recipes', 'Favorite')),
+                ('cart_count', ShoppingCart))})
+        ShoppingListItem.objects.filter(user_id__in=buyers_ids).delete()
+        totals = RecipeIngredients.objects.filter(
+            recipe__shoppingcart__buyer_id__in=buyers_ids
+        ).values(
+            'recipe__shoppingcart__buyer_id', 'ingredients_id'
+        ).annotate(amount=models.Sum('amount'))
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=row['recipe__shoppingcart__buyer_id'],
+                ingredients_id=row['ingredients_id'],
+                amount=row['amount'])
+            for row in totals)
+
+
+def constraint_exists(schema_editor, table, name):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_constraint WHERE conname = %s '
+            'AND conrelid = %s::regclass', [name, table])
+        return cursor.fetchone() is not None
+
+
+def add_indexes(apps, schema_editor):
+    """На PostgreSQL индексы строятся CONCURRENTLY, без блокировки записи,
+    и уникальные индексы затем становятся ограничениями. Невалидный индекс
+    прерванной попытки удаляется и строится заново, а уже добавленное
+    ограничение не добавляется повторно"""
+    quote = schema_editor.quote_name
+    postgresql = is_postgresql(schema_editor)
+    concurrently = 'CONCURRENTLY IF NOT EXISTS' if postgresql else ''
+    for model_name, _, constraint in UNIQUE_CONSTRAINTS:
+        model = apps.get_model('recipes', model_name)
+        table = quote(model._meta.db_table)
+        name = quote(constraint.name)
+        columns = ', '.join(
+            quote(model._meta.get_field(field).column)
+            for field in constraint.fields)
+        if postgresql:
+            if constraint_exists(
+                    schema_editor, model._meta.db_table, constraint.name):
+                continue
+            drop_invalid_index(schema_editor, constraint.name)
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX {concurrently} {name} '
+            f'ON {table} ({columns})')
+        if postgresql:
+            schema_editor.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {name} '
+                f'UNIQUE USING INDEX {name}')
+    through = apps.get_model('recipes', 'Recipe').tags.through
+    columns = ', '.join(
+        quote(through._meta.get_field(field).column)
+        for field in ('tags', 'recipe'))
+    if postgresql:
+        drop_invalid_index(schema_editor, TAGS_INDEX)
+    schema_editor.execute(
+        f'CREATE INDEX {concurrently} {quote(TAGS_INDEX)} '
+        f'ON {quote(through._meta.db_table)} ({columns})')
+
+
+def remove_indexes(apps, schema_editor):
+    quote = schema_editor.quote_name
+    for model_name, _, constraint in UNIQUE_CONSTRAINTS:
+        model = apps.get_model('recipes', model_name)
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(
+                f'ALTER TABLE {quote(model._meta.db_table)} '
+                f'DROP CONSTRAINT {quote(constraint.name)}')
+        else:
+            schema_editor.execute(f'DROP INDEX {quote(constraint.name)}')
+    schema_editor.execute(f'DROP INDEX {quote(TAGS_INDEX)}')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0006_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_indexes, remove_indexes),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name=model_name.lower(), constraint=constraint)
+                for model_name, _, constraint in UNIQUE_CONSTRAINTS
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2 on 2026-10-18 20:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_content_addressed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCard',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='recipes.recipe')),
+                ('data', models.JSONField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
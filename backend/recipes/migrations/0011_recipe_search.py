@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import migrations
+
+INGREDIENTS = '''
+    SELECT {aggregate}(ingredient.name, ' ')
+    FROM recipes_recipeingredients AS item
+    JOIN recipes_ingredients AS ingredient
+        ON ingredient.id = item.ingredients_id
+    WHERE item.recipe_id = recipe.id'''
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector')
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+            'USING gin (search_vector)')
+        schema_editor.execute(
+            'UPDATE recipes_recipe AS recipe SET search_vector = '
+            "setweight(to_tsvector(%s::regconfig, recipe.name), 'A') || "
+            'setweight(to_tsvector(%s::regconfig, coalesce(('
+            + INGREDIENTS.format(aggregate='string_agg') + "), '')), 'B') || "
+            "setweight(to_tsvector(%s::regconfig, recipe.text), 'C')",
+            [settings.RECIPE_SEARCH_CONFIG] * 3)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+            "name, ingredients, text, tokenize = 'unicode61 "
+            "remove_diacritics 2')")
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_fts (rowid, name, ingredients, text) '
+            'SELECT recipe.id, recipe.name, coalesce(('
+            + INGREDIENTS.format(aggregate='group_concat')
+            + "), ''), recipe.text FROM recipes_recipe AS recipe")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_card'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2 on 2026-10-18 22:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_reference_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientsChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.IntegerField()),
+            ],
+        ),
+    ]
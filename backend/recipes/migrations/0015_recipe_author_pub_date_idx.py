@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+from recipes.migration_indexes import add_index_concurrently
+
+
+class Migration(migrations.Migration):
+    """Индекс ленты по рецептам автора строится на большой таблице
+    рецептов, поэтому отдельно от 0012 и на PostgreSQL — CONCURRENTLY"""
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0014_ingredients_change'),
+    ]
+
+    operations = [
+        add_index_concurrently('recipe', models.Index(
+            fields=['author', '-pub_date', '-id'],
+            name='recipe_author_pub_date_idx')),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+from recipes.migration_indexes import add_index_concurrently
+
+
+class Migration(migrations.Migration):
+    """Индекс сортировки по популярности строится на большой таблице
+    рецептов, поэтому отдельно от 0006 и на PostgreSQL — CONCURRENTLY"""
+
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0015_recipe_author_pub_date_idx'),
+    ]
+
+    operations = [
+        add_index_concurrently('recipe', models.Index(
+            fields=['-favorites_count', '-id'],
+            name='recipe_favorites_count_idx')),
+    ]
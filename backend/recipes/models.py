@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+
 
 User = get_user_model()
 
@@ -10,6 +14,11 @@ class Ingredients(models.Model):
     name = models.CharField(max_length=200)
     measurement_unit = models.CharField(max_length=200)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['name', 'measurement_unit'],
+            name='ingredients_unique')]
+
     def __str__(self):
         return f'{self.name}'
 
@@ -25,12 +34,58 @@ class Tags(models.Model):
         return f'{self.name}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для чтения без запросов на каждую строку"""
+
+    def with_related(self):
+        return self.prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredients.objects.select_related(
+                    'ingredients').order_by('id')))
+
+    def with_user_flags(self, user):
+        if user is None or user.is_anonymous:
+            return self.select_related('author').annotate(
+                is_favorited=Value(False, models.BooleanField()),
+                is_in_shopping_cart=Value(False, models.BooleanField()))
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                buyer=user, recipe=OuterRef('pk'))),
+        ).prefetch_related(Prefetch(
+            'author', queryset=User.objects.annotate(
+                is_subscribed=Exists(Subscribes.objects.filter(
+                    user=user, following=OuterRef('pk'))))))
+
+    def latest_for_authors(self, authors_ids, limit=None):
+        """Последние limit рецептов каждого из авторов одним запросом"""
+        queryset = self.filter(author_id__in=authors_ids)
+        if limit is None:
+            return queryset
+        ranked = Recipe.objects.filter(author_id__in=authors_ids).annotate(
+            row_number=Window(
+                RowNumber(), partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()))
+        ).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        quote = connection.ops.quote_name
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT {quote("id")} FROM ({sql}) ranked '
+            f'WHERE {quote("row_number")} <= %s', (*params, limit)))
+
+
 class Recipe(models.Model):
     """Модель рецептов"""
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     image = models.ImageField(
-        upload_to='photos/%Y/%m/%d/', verbose_name='Фото рецепта')
+        upload_to='photos/', verbose_name='Фото рецепта')
+    image_variants = models.JSONField(
+        default=dict, blank=True, editable=False,
+        verbose_name='Уменьшенные копии фото')
     text = models.TextField(max_length=200)
     ingredients = models.ManyToManyField(
         Ingredients, through='RecipeIngredients')
@@ -38,9 +93,25 @@ class Recipe(models.Model):
     cooking_time = models.IntegerField(validators=[MinValueValidator(1)])
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name='Дата публикации')
+    favorites_count = models.PositiveIntegerField(
+        default=0, verbose_name='добавлено в избранное')
+    cart_count = models.PositiveIntegerField(
+        default=0, verbose_name='добавлено в корзину')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -53,6 +124,12 @@ class ShoppingCart(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, related_name='shoppingcart')
 
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['buyer', 'recipe'],
+            name='unique_shopping_cart'
+        )]
+
     def __str__(self):
         return f'{self.recipe} добавлен пользователем {self.buyer} в корзину'
 
@@ -97,5 +174,85 @@ class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='unique_favorite'
+        )]
+
     def __str__(self):
         return f'{self.user} добавил в избранное {self.recipe}'
+
+
+class RecipeCard(models.Model):
+    """Готовое представление рецепта без флагов пользователя: лента
+    и карточка рецепта читаются из одной таблицы"""
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='card')
+    data = models.JSONField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Карточка {self.recipe_id}'
+
+
+class IngredientsChange(models.Model):
+    """Журнал изменений наборов ингридиентов рецептов: записывается
+    в транзакции изменения, по нему каждый процесс догружает в индекс
+    подбора рецептов только изменённые"""
+    recipe_id = models.IntegerField()
+
+    def __str__(self):
+        return f'{self.id}: рецепт {self.recipe_id}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя: записывается при публикации
+    рецепта каждому подписчику автора, лента читается по индексу"""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='unique_feed_entry')]
+        indexes = [models.Index(
+            fields=['user', '-pub_date', '-recipe'],
+            name='feed_user_pub_date_idx')]
+
+    def __str__(self):
+        return f'{self.recipe_id} в ленте {self.user_id}'
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингридиента в списке покупок пользователя"""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shoppinglist')
+    ingredients = models.ForeignKey(
+        Ingredients, on_delete=models.CASCADE, related_name='shoppinglist')
+    amount = models.IntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredients'],
+            name='shopping_list_unique')]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredients} {self.amount}'
+
+
+class ReferenceVersion(models.Model):
+    """Версия справочника для воркеров без общего кэша: меняется
+    при каждом изменении справочника, а справочник целиком читается
+    из базы только при новой версии"""
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.CharField(max_length=32)
+
+    def __str__(self):
+        return f'{self.name} {self.version}'
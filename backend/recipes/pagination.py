@@ -1,5 +1,162 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LimitPagination(PageNumberPagination):
+    """Постраничная выдача по page/limit, а при переданном cursor — выдача
+    по ключу сортировки без OFFSET и без COUNT(*), если не передан count"""
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        reverse, position = self.decode_cursor(
+            request.query_params[self.cursor_query_param], queryset.model)
+        self.count = None
+        if request.query_params.get(self.count_query_param) in (
+                '1', 'true', 'True'):
+            self.count = queryset.count()
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(position, reverse))
+        queryset = queryset.order_by(*(
+            self.reverse_field(field) if reverse else field
+            for field in self.ordering))
+        return self.set_page(
+            list(queryset[:page_size + 1]), page_size, reverse, position)
+
+    def set_page(self, results, page_size, reverse, position):
+        """Страница из page_size + 1 строк после позиции курсора
+        и позиции для ссылок на соседние страницы"""
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        has_next = position is not None if reverse else has_more
+        has_previous = has_more if reverse else position is not None
+        self.next_position = (
+            self.get_position(results[-1]) if results and has_next else None)
+        self.previous_position = (
+            self.get_position(results[0])
+            if results and has_previous else None)
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response = {}
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_cursor_link(self.next_position, False)
+        response['previous'] = self.get_cursor_link(
+            self.previous_position, True)
+        response['results'] = data
+        return Response(response)
+
+    @staticmethod
+    def reverse_field(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def get_position(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def get_keyset_filter(self, position, reverse, ordering=None):
+        """Строки после позиции в порядке self.ordering (или до неё)"""
+        ordering = ordering or self.ordering
+        keyset_filter = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'gt' if field.startswith('-') == reverse else 'lt'
+            condition = Q(**{f'{name}__{lookup}': position[index]})
+            for previous_field, value in zip(
+                    ordering[:index], position[:index]):
+                condition &= Q(**{previous_field.lstrip('-'): value})
+            keyset_filter |= condition
+        return keyset_filter
+
+    def decode_cursor(self, cursor, model):
+        if not cursor:
+            return False, None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values = data['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)]
+            return bool(data['r']), position
+        except (binascii.Error, KeyError, TypeError, ValueError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_cursor_link(self, position, reverse):
+        if position is None:
+            return None
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position]
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({'r': reverse, 'p': values}).encode()).decode()
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class SearchPagination(LimitPagination):
+    """Выдача поиска по релевантности: только по page/limit"""
+    cursor_query_param = None
+
+
+class FeedPagination(LimitPagination):
+    """Лента подписок только по курсору: страница собирается из нескольких
+    источников [(queryset, (поле даты, поле id рецепта))], каждый читается
+    по своему индексу не дальше page_size + 1 строк; результаты — пары
+    (дата публикации, id рецепта)"""
+    cursor_ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, sources, request, view=None):
+        self.cursor_mode = True
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        self.ordering = self.cursor_ordering
+        self.count = None
+        reverse, position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param, ''),
+            sources[0][0].model)
+        rows = set()
+        for queryset, fields in sources:
+            ordering = [f'-{field}' for field in fields]
+            if position is not None:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(position, reverse, ordering))
+            rows.update(queryset.order_by(*(
+                self.reverse_field(field) if reverse else field
+                for field in ordering
+            )).values_list(*fields)[:page_size + 1])
+        return self.set_page(
+            sorted(rows, reverse=not reverse)[:page_size + 1],
+            page_size, reverse, position)
+
+    def get_position(self, obj):
+        return list(obj)
@@ -0,0 +1,151 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache import ingredients_reference, tags_reference
+from .filters import split_values
+from .models import Favorite, ShoppingCart, Subscribes
+
+FEED_VERSION_KEY = 'recipes:feed:version'
+LIST_PARAMS = ('author', 'count', 'cursor', 'is_favorited',
+               'is_in_shopping_cart', 'limit', 'ordering', 'page', 'tags',
+               'tags_mode')
+MULTI_VALUE_PARAMS = ('tags',)
+
+
+def get_recipe_version_key(recipe_id):
+    return f'recipes:{recipe_id}:version'
+
+
+def get_version(key):
+    """Время последнего изменения; если версии нет в кэше, ею становится
+    текущее время, поэтому старые ответы из кэша не читаются"""
+    version = cache.get(key)
+    if version is None:
+        version = time.time()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_recipe_versions(recipe_ids):
+    """Версии нескольких рецептов одним обращением к кэшу"""
+    keys = {pk: get_recipe_version_key(pk) for pk in recipe_ids}
+    versions = cache.get_many(keys.values())
+    return {
+        pk: versions[key] if key in versions else get_version(key)
+        for pk, key in keys.items()}
+
+
+def invalidate_recipes(recipe_ids=()):
+    """Новые версии ленты и карточек рецептов"""
+    now = time.time()
+    versions = {get_recipe_version_key(pk): now for pk in recipe_ids}
+    versions[FEED_VERSION_KEY] = now
+    cache.set_many(versions, None)
+
+
+def invalidate_recipes_on_commit(recipe_ids=()):
+    """Версии меняются после коммита: иначе параллельный запрос успел бы
+    закэшировать старые данные уже под новой версией"""
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: invalidate_recipes(recipe_ids))
+
+
+def normalize_params(query_params, allowed):
+    """Параметры запроса в постоянном порядке без пустых значений и page=1,
+    тэги — отсортированные и без повторов, как их понимает фильтр; None,
+    если есть параметры, от которых кэш не зависит"""
+    params = []
+    for name in sorted(query_params):
+        values = [value for value in query_params.getlist(name) if value]
+        if name not in allowed or (
+                len(values) > 1 and name not in MULTI_VALUE_PARAMS):
+            return None
+        if name in MULTI_VALUE_PARAMS:
+            values = sorted(split_values(values))
+        if values and not (name == 'page' and values == ['1']):
+            params.append((name, values))
+    return params
+
+
+def get_response_key(request, recipe_id=None):
+    """Ключ ответа в кэше, ETag и время изменения для запроса
+    к ленте рецептов или к рецепту; None, если ответ не кэшируется.
+    Версии меняет тот воркер, который изменил рецепт, поэтому без общего
+    кэша (SHARED_CACHE) остальные отдавали бы старые ответы, и кэш
+    ответов выключен"""
+    options = settings.RECIPES_RESPONSE_CACHE
+    if not options['ENABLED'] or not settings.SHARED_CACHE:
+        return None
+    params = normalize_params(
+        request.GET, LIST_PARAMS if recipe_id is None else ())
+    if params is None:
+        return None
+    if recipe_id is None:
+        version = get_version(FEED_VERSION_KEY)
+    else:
+        version = get_version(get_recipe_version_key(recipe_id))
+    digest = hashlib.md5(repr((
+        request.build_absolute_uri(request.path), params, version,
+        tags_reference.get_version(), ingredients_reference.get_version(),
+    )).encode()).hexdigest()
+    return f'recipes:response:{digest}', f'"recipes-{digest}"', version
+
+
+def get_fragments(recipe_ids, base_url, render):
+    """Представления рецептов без флагов пользователя {id: словарь},
+    общие для всех пользователей; рецепты, которых нет в кэше,
+    представляет render(ids) и они сохраняются в кэш. Как и кэш ответов,
+    работает только с общим кэшем (SHARED_CACHE)"""
+    options = settings.RECIPES_RESPONSE_CACHE
+    if not options['ENABLED'] or not settings.SHARED_CACHE:
+        return render(recipe_ids)
+    references = (
+        base_url, tags_reference.get_version(),
+        ingredients_reference.get_version())
+    keys = {
+        pk: 'recipes:fragment:' + hashlib.md5(
+            repr((pk, version) + references).encode()).hexdigest()
+        for pk, version in get_recipe_versions(recipe_ids).items()}
+    cached = cache.get_many(keys.values())
+    fragments = {
+        pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in recipe_ids if pk not in fragments]
+    if missing:
+        rendered = render(missing)
+        cache.set_many(
+            {keys[pk]: fragment for pk, fragment in rendered.items()},
+            options['TIMEOUT'])
+        fragments.update(rendered)
+    return fragments
+
+
+def apply_user_flags(fragments, user):
+    """Флаги пользователя поверх общих представлений: избранное, корзина
+    и подписки на авторов читаются по одному запросу на страницу"""
+    if user is None or user.is_anonymous or not fragments:
+        return fragments
+    recipe_ids = [fragment['id'] for fragment in fragments]
+    authors_ids = {fragment['author']['id'] for fragment in fragments}
+    favorites = set(Favorite.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    cart = set(ShoppingCart.objects.filter(
+        buyer=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    subscriptions = set(Subscribes.objects.filter(
+        user=user, following_id__in=authors_ids
+    ).values_list('following_id', flat=True))
+    return [
+        {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': fragment['author']['id'] in subscriptions},
+            'is_favorited': fragment['id'] in favorites,
+            'is_in_shopping_cart': fragment['id'] in cart,
+        } for fragment in fragments]
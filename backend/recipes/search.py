@@ -0,0 +1,152 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+WORD = re.compile(r'\w+')
+MAX_WORDS = 8
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def get_words(query):
+    return WORD.findall(query.lower())[:MAX_WORDS]
+
+
+class PostgresSearch:
+    """Столбец recipes_recipe.search_vector с GIN-индексом: название
+    с весом A, ингридиенты — B, описание — C"""
+
+    index_sql = '''
+        UPDATE recipes_recipe AS recipe SET search_vector =
+            setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A')
+            || setweight(to_tsvector(%(config)s::regconfig, coalesce((
+                SELECT string_agg(ingredient.name, ' ')
+                FROM recipes_recipeingredients AS item
+                JOIN recipes_ingredients AS ingredient
+                    ON ingredient.id = item.ingredients_id
+                WHERE item.recipe_id = recipe.id), '')), 'B')
+            || setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')
+        WHERE recipe.id = ANY(%(ids)s)'''
+
+    def index(self, recipe_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(self.index_sql, {
+                'config': settings.RECIPE_SEARCH_CONFIG,
+                'ids': list(recipe_ids)})
+
+    def remove(self, recipe_ids):
+        pass
+
+    def search(self, queryset, words):
+        tsquery = ' & '.join(words) + ':*'
+        params = (settings.RECIPE_SEARCH_CONFIG, tsquery)
+        return queryset.filter(RawSQL(
+            '"recipes_recipe"."search_vector" @@ '
+            'to_tsquery(%s::regconfig, %s)', params,
+            output_field=BooleanField())
+        ).annotate(search_rank=RawSQL(
+            'ts_rank_cd("recipes_recipe"."search_vector", '
+            'to_tsquery(%s::regconfig, %s))', params,
+            output_field=FloatField())
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+
+class SQLiteSearch:
+    """Таблица FTS5 recipes_recipe_fts с rowid = id рецепта для локального
+    запуска; релевантность — bm25 с теми же весами полей"""
+
+    index_sql = f'''
+        INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text)
+        SELECT recipe.id, recipe.name, coalesce((
+            SELECT group_concat(ingredient.name, ' ')
+            FROM recipes_recipeingredients AS item
+            JOIN recipes_ingredients AS ingredient
+                ON ingredient.id = item.ingredients_id
+            WHERE item.recipe_id = recipe.id), ''), recipe.text
+        FROM recipes_recipe AS recipe WHERE recipe.id IN ({{}})'''
+
+    def index(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        self.remove(recipe_ids)
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(self.index_sql.format(placeholders), recipe_ids)
+
+    def remove(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids)
+
+    def search(self, queryset, words):
+        return RankedResults(
+            queryset, ' '.join(f'"{word}"' for word in words) + '*')
+
+
+class RankedResults:
+    """Выдача FTS5 по bm25 одним запросом к индексу, без вычисления
+    релевантности для каждой строки рецептов; как QuerySet, поддерживает
+    count() и срезы для пагинации"""
+    ordered = True
+
+    def __init__(self, queryset, match):
+        self.queryset = queryset
+        self.match = match
+
+    def execute(self, select, suffix='', params=()):
+        sql = (f'SELECT {select} FROM {FTS_TABLE} '
+               f'WHERE {FTS_TABLE} MATCH %s')
+        sql_params = [self.match]
+        if self.queryset.query.where:
+            recipes_sql, recipes_params = self.queryset.values(
+                'id').order_by().query.sql_with_params()
+            sql += f' AND rowid IN ({recipes_sql})'
+            sql_params.extend(recipes_params)
+        with connection.cursor() as cursor:
+            cursor.execute(sql + suffix, sql_params + list(params))
+            return cursor.fetchall()
+
+    def count(self):
+        return self.execute('count(*)')[0][0]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step:
+            raise TypeError('Поддерживаются только срезы')
+        start = index.start or 0
+        if index.stop is not None and index.stop <= start:
+            return []
+        limit = -1 if index.stop is None else index.stop - start
+        ids = [row[0] for row in self.execute(
+            'rowid', f' ORDER BY bm25({FTS_TABLE}, 10.0, 4.0, 1.0), '
+            'rowid DESC LIMIT %s OFFSET %s', (limit, start))]
+        recipes = self.queryset.in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
+
+
+BACKENDS = {'postgresql': PostgresSearch(), 'sqlite': SQLiteSearch()}
+
+
+def index_recipes(recipe_ids):
+    """Обновление поискового индекса рецептов"""
+    if recipe_ids:
+        BACKENDS[connection.vendor].index(recipe_ids)
+
+
+def remove_recipes(recipe_ids):
+    if recipe_ids:
+        BACKENDS[connection.vendor].remove(recipe_ids)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, в названии, ингридиентах или описании которых есть все
+    слова запроса (последнее — по началу слова), по убыванию
+    релевантности: QuerySet или RankedResults; None, если в запросе
+    нет слов"""
+    words = get_words(query)
+    if not words:
+        return None
+    return BACKENDS[connection.vendor].search(queryset, words)
@@ -1,22 +1,34 @@
 from rest_framework import serializers
-from .models import (Tags, Recipe,
+from .cache import ingredients_reference, tags_reference
+from .images import ImageError, decode_base64, inspect_image
+from .metrics import TimedSerializerMixin
+from .response_cache import apply_user_flags, get_fragments
+from .models import (Tags, Recipe, RecipeCard,
                      RecipeIngredients, ShoppingCart,
                      Favorite, Ingredients)
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import models
 from drf_extra_fields.fields import Base64ImageField
 from users.serializers import CurrentUserProfileSerializer
 
 User = get_user_model()
 
+BULK_RECIPES_LIMIT = 100
 
-class TagsSerializer(serializers.ModelSerializer):
+
+class TagsSerializer(TimedSerializerMixin,
+                     serializers.ModelSerializer):
     """Сериализатор для тэгов"""
     class Meta:
         fields = '__all__'
         model = Tags
 
 
-class IngredientsSerializer(serializers.ModelSerializer):
+class IngredientsSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
     """Сериализатор для ингридиентов"""
     name = serializers.CharField(allow_blank=True)
     measurement_unit = serializers.CharField(allow_blank=True)
@@ -46,23 +58,129 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipePostSerializer(serializers.ModelSerializer):
+class TagsField(serializers.ManyRelatedField):
+    """Список id тэгов, проверяемый по кэшу справочника тэгов"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        tags_ids = []
+        for item in data:
+            if isinstance(item, bool) or not str(item).isdecimal():
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(item).__name__)
+            tags_ids.append(int(item))
+        _, tags = tags_reference.get()
+        for tag_id in tags_ids:
+            if tag_id not in tags:
+                self.child_relation.fail('does_not_exist', pk_value=tag_id)
+        return tags_ids
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Base64ImageField, который декодирует изображение по частям
+    во временный файл и проверяет его по заголовку, не держа в памяти
+    несколько копий"""
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES or not isinstance(
+                base64_data, str):
+            return super().to_internal_value(base64_data)
+        header, separator, payload = base64_data.partition(';base64,')
+        try:
+            file = decode_base64(payload if separator else header)
+            extension = inspect_image(file)
+        except ImageError as error:
+            raise serializers.ValidationError(str(error))
+        return File(file, name=f'{self.get_file_name(None)}.{extension}')
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Адреса уменьшенных копий фото {вариант: {формат: url}}; пустой
+    словарь, пока копии не готовы"""
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+
+        def get_url(name):
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return {
+            variant: {
+                extension: get_url(name) for extension, name in files.items()}
+            for variant, files in variants.items()}
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов из общих для всех пользователей представлений
+    в кэше и флагов текущего пользователя; из переданных рецептов нужны
+    только id. Представления, которых нет в кэше, читаются из RecipeCard"""
+
+    def with_absolute_urls(self, card):
+        request = self.context.get('request')
+        if request is None:
+            return card
+        return {
+            **card,
+            'image': card['image'] and request.build_absolute_uri(
+                card['image']),
+            'image_variants': {
+                variant: {
+                    extension: request.build_absolute_uri(url)
+                    for extension, url in files.items()}
+                for variant, files in card['image_variants'].items()},
+        }
+
+    def render_fragments(self, recipe_ids):
+        cards = {}
+        if settings.RECIPE_CARDS:
+            cards = dict(RecipeCard.objects.filter(
+                recipe_id__in=recipe_ids).values_list('recipe_id', 'data'))
+        missing = [pk for pk in recipe_ids if pk not in cards]
+        if missing:
+            cards.update(render_cards(missing))
+        return {
+            pk: self.with_absolute_urls(card) for pk, card in cards.items()}
+
+    def to_representation(self, data):
+        recipes_ids = [
+            recipe.pk for recipe in (
+                data.all() if isinstance(data, models.Manager) else data)]
+        request = self.context.get('request')
+        fragments = get_fragments(
+            recipes_ids,
+            request.build_absolute_uri('/') if request else None,
+            self.render_fragments)
+        return apply_user_flags(
+            [fragments[pk] for pk in recipes_ids if pk in fragments],
+            request.user if request else None)
+
+
+class RecipePostSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     author = CurrentUserProfileSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tags.objects.all(), many=True)
+    tags = TagsField(child_relation=serializers.PrimaryKeyRelatedField(
+        queryset=Tags.objects.all()))
     ingredients = AmountSerializer(source='recipeingredients', many=True)
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'author', 'image', 'text',
+        list_serializer_class = RecipeListSerializer
+        fields = ('id', 'name', 'author', 'image', 'image_variants', 'text',
                   'tags', 'ingredients', 'cooking_time', 'is_favorited',
                   'is_in_shopping_cart')
 
     def get_is_favorited(self, obj):
         """проверка наличия рецепта в избранном"""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -71,6 +189,8 @@ class RecipePostSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """проверка наличия рецепта в корзине"""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -79,52 +199,62 @@ class RecipePostSerializer(serializers.ModelSerializer):
 
     def validate_ingredients(self, attrs):
         ingredients = attrs
-        ingredients_in_recipe = []
+        ingredients_in_recipe = set()
         for ingred in ingredients:
             if ingred['amount'] < 1:
                 raise serializers.ValidationError(
                     'Введите количество ингридиента(ов) не менее 1 ед.')
             inredient_id = ingred['ingredients']['id']
-            get_ingredient_to_check = Ingredients.objects.filter(
-                id=inredient_id)
-            if get_ingredient_to_check in ingredients_in_recipe:
+            if inredient_id in ingredients_in_recipe:
                 raise serializers.ValidationError(
                     'Вы уже добавили этот ингридиент')
-            ingredients_in_recipe.append(get_ingredient_to_check)
+            ingredients_in_recipe.add(inredient_id)
+        _, existing = ingredients_reference.get()
+        missing = ingredients_in_recipe - existing.keys()
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингридиенты не найдены: {sorted(missing)}')
         return attrs
 
     def to_representation(self, instance):
-        tags = instance.tags.all()
-        tags_fields_to_representation = [
+        representation = super().to_representation(instance)
+        representation['tags'] = [
             {
                 'name': tag.name,
                 'color': tag.color,
                 'slug': tag.slug
-            } for tag in tags]
-        representation = super().to_representation(instance)
-        if instance.tags:
-            representation['tags'] = tags_fields_to_representation
-        ingredients = instance.ingredients.all()
-        amount = instance.recipeingredients.all()
-        amount_list = []
-        print(ingredients)
-        for i, ingredient in enumerate(ingredients):
-            i = {
-                'id': ingredient.id,
-                'name': ingredient.name,
-                'measurement_unit': ingredient.measurement_unit,
-                'amount': amount[i].amount}
-            amount_list.append(i)
-        representation['ingredients'] = amount_list
+            } for tag in instance.tags.all()]
+        representation['ingredients'] = [
+            {
+                'id': item.ingredients.id,
+                'name': item.ingredients.name,
+                'measurement_unit': item.ingredients.measurement_unit,
+                'amount': item.amount
+            } for item in instance.recipeingredients.all()]
         return representation
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+def render_cards(recipe_ids):
+    """Представления рецептов без флагов пользователя и с относительными
+    адресами фото {id: словарь}"""
+    recipes = Recipe.objects.filter(
+        pk__in=recipe_ids).with_related().with_user_flags(None)
+    cards = {}
+    for recipe in recipes:
+        recipe.author.is_subscribed = False
+        cards[recipe.pk] = RecipePostSerializer(recipe).data
+    return cards
+
+
+class SubscribeSerializer(TimedSerializerMixin,
+                          serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField()
     recipe_count = serializers.SerializerMethodField(read_only=True)
     username = serializers.CharField(required=False)
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'latest_recipes'):
+            return obj.latest_recipes
         request = self.context.get('request')
         recipe_limit = request.GET.get('recipes_limit')
         queryset = Recipe.objects.filter(author_id=obj.id).order_by('pub_date')
@@ -134,6 +264,8 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return RecipePostSerializer(queryset, many=True).data
 
     def get_recipe_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author__id=obj.id).count()
 
     class Meta:
@@ -142,8 +274,16 @@ class SubscribeSerializer(serializers.ModelSerializer):
         model = User
 
 
-class ShoppingCartAndFavouriteSerializer(serializers.Serializer):
+class ShoppingCartAndFavouriteSerializer(TimedSerializerMixin,
+                                         serializers.Serializer):
     id = serializers.IntegerField(read_only=True)
     name = serializers.CharField(read_only=True)
     cooking_time = serializers.IntegerField(read_only=True)
     image = Base64ImageField(read_only=True)
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """Список id рецептов для добавления или удаления одним запросом"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT)
@@ -0,0 +1,289 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cards import rebuild_cards
+from .images import process_recipe_image
+from .models import Favorite, Recipe, RecipeIngredients, ShoppingCart
+from .response_cache import invalidate_recipes
+from .shopping_list import (change_shopping_lists, get_recipe_amounts,
+                            get_recipes_amounts)
+from .tasks import enqueue
+
+
+def set_recipe_ingredients(recipe, ingredients):
+    """Приводит ингридиенты рецепта к новому набору по разнице со старым"""
+    new_amounts = {
+        item['ingredients']['id']: item['amount'] for item in ingredients}
+    current = {
+        row.ingredients_id: row
+        for row in RecipeIngredients.objects.filter(recipe=recipe)}
+    changes = {
+        ingredient_id: new_amounts.get(ingredient_id, 0) - row.amount
+        for ingredient_id, row in current.items()}
+    changes.update(
+        (ingredient_id, amount)
+        for ingredient_id, amount in new_amounts.items()
+        if ingredient_id not in current)
+    removed = current.keys() - new_amounts.keys()
+    if removed:
+        RecipeIngredients.objects.filter(
+            recipe=recipe, ingredients_id__in=removed).delete()
+    changed = []
+    for ingredient_id, row in current.items():
+        amount = new_amounts.get(ingredient_id)
+        if amount is not None and row.amount != amount:
+            row.amount = amount
+            changed.append(row)
+    if changed:
+        RecipeIngredients.objects.bulk_update(changed, ['amount'])
+    added = [
+        RecipeIngredients(
+            recipe=recipe, ingredients_id=ingredient_id, amount=amount)
+        for ingredient_id, amount in new_amounts.items()
+        if ingredient_id not in current]
+    if added:
+        RecipeIngredients.objects.bulk_create(added)
+    change_shopping_lists(
+        ShoppingCart.objects.filter(recipe=recipe).values_list(
+            'buyer_id', flat=True), changes)
+
+
+def process_image(recipe_id, name):
+    """Задача очереди: уменьшенные копии фото и карточка рецепта
+    с их адресами"""
+    if process_recipe_image(recipe_id, name):
+        rebuild_cards([recipe_id])
+        invalidate_recipes([recipe_id])
+
+
+def schedule_image_processing(recipe):
+    """Уменьшенные копии фото делаются в фоне после коммита"""
+    recipe_id, name = recipe.pk, recipe.image.name
+    transaction.on_commit(lambda: enqueue(process_image, recipe_id, name))
+
+
+@transaction.atomic
+def create_recipe(author, validated_data):
+    """Создание рецепта с тэгами и ингридиентами"""
+    tags = validated_data.pop('tags')
+    ingredients = validated_data.pop('recipeingredients')
+    recipe = Recipe.objects.create(author=author, **validated_data)
+    recipe.tags.set(tags)
+    RecipeIngredients.objects.bulk_create(
+        RecipeIngredients(
+            recipe=recipe,
+            ingredients_id=item['ingredients']['id'],
+            amount=item['amount'])
+        for item in ingredients)
+    schedule_image_processing(recipe)
+    rebuild_cards([recipe.pk])
+    return recipe
+
+
+@transaction.atomic
+def update_recipe(recipe, validated_data):
+    """Изменение рецепта: переданные поля, тэги и ингридиенты"""
+    tags = validated_data.pop('tags', None)
+    ingredients = validated_data.pop('recipeingredients', None)
+    image = validated_data.pop('image', None)
+    for field, value in validated_data.items():
+        setattr(recipe, field, value)
+    image_changed = False
+    if image is not None:
+        # Файл записывается до save(), чтобы по его имени узнать, сменилось
+        # ли фото, и сбросить копии тем же UPDATE
+        old_image = recipe.image.name
+        recipe.image.save(image.name, image, save=False)
+        image_changed = recipe.image.name != old_image
+        if image_changed:
+            recipe.image_variants = {}
+    recipe.save()
+    if image_changed:
+        schedule_image_processing(recipe)
+    if tags is not None:
+        recipe.tags.set(tags)
+    if ingredients is not None:
+        set_recipe_ingredients(recipe, ingredients)
+    rebuild_cards([recipe.pk])
+    return recipe
+
+
+@transaction.atomic
+def delete_recipe(recipe):
+    """Удаление рецепта вместе с его ингридиентами в списках покупок"""
+    amounts = get_recipe_amounts(recipe)
+    change_shopping_lists(
+        ShoppingCart.objects.filter(recipe=recipe).values_list(
+            'buyer_id', flat=True),
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()})
+    recipe.delete()
+
+
+def get_counters_subqueries():
+    """Фактическое число добавлений рецепта в избранное и в корзины"""
+    return {
+        field: Coalesce(Subquery(
+            model.objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                count=Count('id')
+            ).values('count')), 0)
+        for field, model in (('favorites_count', Favorite),
+                             ('cart_count', ShoppingCart))}
+
+
+def change_counter(recipe_id, field, value):
+    Recipe.objects.filter(pk=recipe_id).update(**{field: F(field) + value})
+
+
+def insert_ignore(model, **values):
+    """Одна вставка INSERT ... ON CONFLICT DO NOTHING без предварительной
+    проверки; True, если строка добавлена"""
+    ops = connection.ops
+    fields = [model._meta.get_field(name) for name in values]
+    columns = ', '.join(ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = (f'{ops.insert_statement(ignore_conflicts=True)} '
+           f'{ops.quote_name(model._meta.db_table)} ({columns}) '
+           f'VALUES ({placeholders}) '
+           f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            field.get_db_prep_value(value, connection)
+            for field, value in zip(fields, values.values())])
+        return cursor.rowcount == 1
+
+
+def insert_ignore_many(model, owner, user_id, recipe_ids):
+    """Связи пользователя с рецептами одним INSERT ... ON CONFLICT DO
+    NOTHING RETURNING; id рецептов, для которых строка добавлена"""
+    if not recipe_ids:
+        return []
+    ops = connection.ops
+    owner_column = model._meta.get_field(owner).column
+    recipe_column = model._meta.get_field('recipe').column
+    placeholders = ', '.join(['(%s, %s)'] * len(recipe_ids))
+    sql = (f'{ops.insert_statement(ignore_conflicts=True)} '
+           f'{ops.quote_name(model._meta.db_table)} '
+           f'({ops.quote_name(owner_column)}, '
+           f'{ops.quote_name(recipe_column)}) '
+           f'VALUES {placeholders} '
+           f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)} '
+           f'RETURNING {ops.quote_name(recipe_column)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            value for recipe_id in recipe_ids
+            for value in (user_id, recipe_id)])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_many(model, owner, user_id, recipe_ids):
+    """Связи пользователя с рецептами одним DELETE ... IN RETURNING;
+    id рецептов, для которых строка удалена"""
+    if not recipe_ids:
+        return []
+    ops = connection.ops
+    owner_column = model._meta.get_field(owner).column
+    recipe_column = model._meta.get_field('recipe').column
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    sql = (f'DELETE FROM {ops.quote_name(model._meta.db_table)} '
+           f'WHERE {ops.quote_name(owner_column)} = %s '
+           f'AND {ops.quote_name(recipe_column)} IN ({placeholders}) '
+           f'RETURNING {ops.quote_name(recipe_column)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *recipe_ids])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def change_counters(recipe_ids, field, value):
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: F(field) + value})
+
+
+@transaction.atomic
+def add_to_favorites(user, recipe):
+    """Добавление в избранное; False, если рецепт уже там"""
+    if not insert_ignore(Favorite, user=user.id, recipe=recipe.id):
+        return False
+    change_counter(recipe.id, 'favorites_count', 1)
+    return True
+
+
+@transaction.atomic
+def remove_from_favorites(user, recipe_id):
+    """Удаление из избранного; False, если рецепта там не было"""
+    deleted, _ = Favorite.objects.filter(
+        user=user, recipe_id=recipe_id).delete()
+    if not deleted:
+        return False
+    change_counter(recipe_id, 'favorites_count', -1)
+    return True
+
+
+@transaction.atomic
+def add_to_shopping_cart(user, recipe):
+    """Добавление рецепта в корзину и его ингридиентов в список покупок;
+    False, если рецепт уже в корзине"""
+    if not insert_ignore(ShoppingCart, buyer=user.id, recipe=recipe.id):
+        return False
+    change_counter(recipe.id, 'cart_count', 1)
+    change_shopping_lists([user.id], get_recipe_amounts(recipe))
+    return True
+
+
+@transaction.atomic
+def remove_from_shopping_cart(user, recipe_id):
+    """Удаление рецепта из корзины и его ингридиентов из списка покупок;
+    False, если рецепта в корзине не было"""
+    deleted, _ = ShoppingCart.objects.filter(
+        buyer=user, recipe_id=recipe_id).delete()
+    if not deleted:
+        return False
+    change_counter(recipe_id, 'cart_count', -1)
+    change_shopping_lists(
+        [user.id],
+        {ingredient_id: -amount for ingredient_id, amount
+         in get_recipe_amounts(recipe_id).items()})
+    return True
+
+
+@transaction.atomic
+def add_many_to_favorites(user, recipe_ids):
+    """Добавление нескольких рецептов в избранное; id добавленных"""
+    added = insert_ignore_many(Favorite, 'user', user.id, recipe_ids)
+    change_counters(added, 'favorites_count', 1)
+    return added
+
+
+@transaction.atomic
+def remove_many_from_favorites(user, recipe_ids):
+    """Удаление нескольких рецептов из избранного; id удалённых"""
+    removed = delete_many(Favorite, 'user', user.id, recipe_ids)
+    change_counters(removed, 'favorites_count', -1)
+    return removed
+
+
+@transaction.atomic
+def add_many_to_shopping_cart(user, recipe_ids):
+    """Добавление нескольких рецептов в корзину и их ингридиентов в список
+    покупок; id добавленных"""
+    added = insert_ignore_many(ShoppingCart, 'buyer', user.id, recipe_ids)
+    if added:
+        change_counters(added, 'cart_count', 1)
+        change_shopping_lists([user.id], get_recipes_amounts(added))
+    return added
+
+
+@transaction.atomic
+def remove_many_from_shopping_cart(user, recipe_ids):
+    """Удаление нескольких рецептов из корзины и их ингридиентов из списка
+    покупок; id удалённых"""
+    removed = delete_many(ShoppingCart, 'buyer', user.id, recipe_ids)
+    if removed:
+        change_counters(removed, 'cart_count', -1)
+        change_shopping_lists(
+            [user.id],
+            {ingredient_id: -amount for ingredient_id, amount
+             in get_recipes_amounts(removed).items()})
+    return removed
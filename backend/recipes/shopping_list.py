@@ -0,0 +1,103 @@
+import csv
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import RecipeIngredients, ShoppingCart, ShoppingListItem
+
+User = get_user_model()
+
+
+def get_shopping_list(user):
+    """Суммарное количество каждого ингридиента из корзины пользователя"""
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredients__name', 'ingredients__measurement_unit', 'amount'
+    ).order_by('ingredients__name')
+
+
+def get_recipe_amounts(recipe):
+    """Количество каждого ингридиента рецепта {id ингридиента: количество}"""
+    return dict(RecipeIngredients.objects.filter(
+        recipe=recipe).values_list('ingredients_id', 'amount'))
+
+
+def get_recipes_amounts(recipe_ids):
+    """Суммарное количество каждого ингридиента нескольких рецептов
+    {id ингридиента: количество}"""
+    return dict(RecipeIngredients.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by().values('ingredients_id').annotate(
+        total=Sum('amount')
+    ).values_list('ingredients_id', 'total'))
+
+
+def get_shopping_list_totals():
+    """Итоги списков покупок, посчитанные заново по корзинам"""
+    totals = ShoppingCart.objects.filter(
+        recipe__recipeingredients__isnull=False
+    ).values(
+        'buyer_id', 'recipe__recipeingredients__ingredients_id'
+    ).annotate(amount=Sum('recipe__recipeingredients__amount'))
+    return {
+        (row['buyer_id'], row['recipe__recipeingredients__ingredients_id']):
+            row['amount']
+        for row in totals.iterator()}
+
+
+def change_shopping_lists(users_ids, changes):
+    """Прибавляет к спискам покупок пользователей изменения количества
+    ингридиентов {id ингридиента: разница}"""
+    changes = {key: value for key, value in changes.items() if value}
+    users_ids = sorted(set(users_ids))
+    if not users_ids or not changes:
+        return
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(
+            id__in=users_ids).values_list('id', flat=True))
+        items = list(ShoppingListItem.objects.filter(
+            user_id__in=users_ids, ingredients_id__in=changes))
+        existing = set()
+        for item in items:
+            item.amount = F('amount') + changes[item.ingredients_id]
+            existing.add((item.user_id, item.ingredients_id))
+        if items:
+            ShoppingListItem.objects.bulk_update(items, ['amount'])
+        ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=user_id, ingredients_id=ingredient_id, amount=amount)
+            for user_id in users_ids
+            for ingredient_id, amount in changes.items()
+            if amount > 0 and (user_id, ingredient_id) not in existing)
+        ShoppingListItem.objects.filter(
+            user_id__in=users_ids, ingredients_id__in=changes,
+            amount__lte=0).delete()
+
+
+def render_txt(rows):
+    for row in rows:
+        yield (f'{row["ingredients__name"]}-{row["amount"]}'
+               f'{row["ingredients__measurement_unit"]} \n')
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингридиент', 'Количество', 'Единица измерения'))
+    for row in rows:
+        yield writer.writerow((
+            row['ingredients__name'],
+            row['amount'],
+            row['ingredients__measurement_unit']))
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+}
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .cache import ingredients_reference, tags_reference
+from .cards import rebuild_cards
+from .feed import remove_from_feed, schedule_fan_out, schedule_fill_feed
+from .matching import record_changes
+from .models import Ingredients, Recipe, Subscribes, Tags
+from .response_cache import invalidate_recipes_on_commit
+from .search import remove_recipes
+
+User = get_user_model()
+
+CARD_RECIPES = {
+    Tags: lambda tag: list(tag.recipes.values_list('pk', flat=True)),
+    Ingredients: lambda ingredient: list(Recipe.objects.filter(
+        ingredients=ingredient).values_list('pk', flat=True)),
+}
+
+
+@receiver([post_save, post_delete], sender=Ingredients)
+def invalidate_ingredients(sender, **kwargs):
+    ingredients_reference.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Tags)
+def invalidate_tags(sender, **kwargs):
+    tags_reference.invalidate()
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_save, sender=Ingredients)
+def rebuild_reference_cards(sender, instance, created, **kwargs):
+    """Название тэга или ингридиента есть в карточках рецептов"""
+    if not created:
+        rebuild_cards(CARD_RECIPES[sender](instance))
+
+
+@receiver(pre_delete, sender=Tags)
+@receiver(pre_delete, sender=Ingredients)
+def remember_reference_cards(sender, instance, **kwargs):
+    instance.card_recipes = CARD_RECIPES[sender](instance)
+
+
+@receiver(post_delete, sender=Tags)
+@receiver(post_delete, sender=Ingredients)
+def rebuild_deleted_reference_cards(sender, instance, **kwargs):
+    rebuild_cards(getattr(instance, 'card_recipes', ()))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipes_on_commit([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search(sender, instance, **kwargs):
+    remove_recipes([instance.pk])
+    record_changes([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        schedule_fan_out(instance.pk)
+
+
+@receiver(post_save, sender=Subscribes)
+def fill_subscriber_feed(sender, instance, created, **kwargs):
+    if created:
+        schedule_fill_feed(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Subscribes)
+def clear_subscriber_feed(sender, instance, **kwargs):
+    remove_from_feed(instance.user_id, instance.following_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Тэги рецепта меняют в сервисах и в админке, где карточка
+    пересобирается после сохранения; здесь — изменения со стороны тэга"""
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_recipes_on_commit([instance.pk])
+    elif action == 'pre_clear':
+        instance.card_recipes = CARD_RECIPES[Tags](instance)
+    elif action == 'post_clear':
+        rebuild_cards(instance.card_recipes)
+        invalidate_recipes_on_commit(instance.card_recipes)
+    elif action in ('post_add', 'post_remove'):
+        rebuild_cards(pk_set)
+        invalidate_recipes_on_commit(pk_set)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    """Имя и почта автора есть в каждом его рецепте; вход в систему
+    меняет только last_login"""
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    recipe_ids = list(
+        Recipe.objects.filter(author=instance).values_list('pk', flat=True))
+    rebuild_cards(recipe_ids)
+    invalidate_recipes_on_commit(recipe_ids)
@@ -0,0 +1,37 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы называются по SHA-256 содержимого внутри каталога upload_to:
+    повторно загруженный файл не записывается заново, а адрес файла
+    никогда не меняет содержимое и кэшируется надолго. Удаляет файлы,
+    на которые больше нет ссылок, команда cleanup_media"""
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name).split('/')[0], hexdigest[:2],
+            hexdigest[2:] + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения не даёт cleanup_media удалить файл,
+            # пока ссылка на него ещё не закоммичена
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
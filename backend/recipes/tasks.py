@@ -0,0 +1,37 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def run_task(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Ошибка в фоновой задаче %s%s', func.__name__, args)
+    finally:
+        connections.close_all()
+
+
+def enqueue(func, *args):
+    """Фоновая задача по настройке TASK_QUEUE: thread — в пуле потоков
+    процесса (задачи теряются при перезапуске воркера, их доделывают
+    команды обслуживания), sync — сразу, none — только командами"""
+    global executor
+    mode = settings.TASK_QUEUE
+    if mode == 'sync':
+        func(*args)
+    elif mode == 'thread':
+        with executor_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=settings.TASK_QUEUE_THREADS,
+                    thread_name_prefix='tasks')
+        executor.submit(run_task, func, *args)
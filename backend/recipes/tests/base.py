@@ -0,0 +1,109 @@
+import base64
+import shutil
+import tempfile
+
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from recipes.matching import ingredient_index
+from recipes.models import Ingredients, Tags
+from recipes.search import FTS_TABLE
+from recipes.services import create_recipe
+
+User = get_user_model()
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgG'
+    'AWjR9awAAAABJRU5ErkJggg==')
+
+
+class RecipesDataMixin:
+    """Пользователи, тэги и ингридиенты для тестов API; файлы пишутся
+    во временный каталог, кэш очищается перед каждым тестом"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(
+            MEDIA_ROOT=cls.media_root, TASK_QUEUE='sync')
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def create_reference_data(cls):
+        cls.author = cls.create_user('author')
+        cls.user = cls.create_user('reader')
+        cls.tags = [
+            Tags.objects.create(name=slug, color='#E26C2D', slug=slug)
+            for slug in ('breakfast', 'lunch', 'dinner')]
+        cls.ingredients = [
+            Ingredients.objects.create(
+                name=f'ингридиент {number}', measurement_unit='г')
+            for number in range(10)]
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.state = None
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com',
+            password='Pa55word!', first_name=username, last_name=username)
+
+    @classmethod
+    def create_recipe(cls, author=None, tags=None, ingredients=None,
+                      name='Рецепт', text='Описание'):
+        if ingredients is None:
+            ingredients = cls.ingredients[:2]
+        with cls.run_on_commit():
+            return create_recipe(author or cls.author, {
+                'name': name,
+                'text': text,
+                'cooking_time': 10,
+                'image': SimpleUploadedFile('recipe.png', PNG),
+                'tags': tags if tags is not None else cls.tags[:1],
+                'recipeingredients': [
+                    {'ingredients': {'id': ingredient.id}, 'amount': 100}
+                    for ingredient in ingredients],
+            })
+
+
+class RecipesAPITestCase(RecipesDataMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_reference_data()
+
+    @classmethod
+    def run_on_commit(cls):
+        return cls.captureOnCommitCallbacks(execute=True)
+
+
+class RecipesTransactionTestCase(RecipesDataMixin, APITransactionTestCase):
+    """Для запросов, которые читают базу из другого потока, например
+    async-view: данные теста закоммичены"""
+
+    def setUp(self):
+        super().setUp()
+        # Таблицу FTS5 очистка базы между тестами не затрагивает
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.create_reference_data()
+
+    @staticmethod
+    def run_on_commit():
+        return nullcontext()
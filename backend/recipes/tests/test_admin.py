@@ -0,0 +1,58 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from recipes.models import Recipe
+
+from .base import RecipesAPITestCase
+
+GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9'
+       b'\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00'
+       b'\x02\x01D\x00;')
+
+
+class RecipeAdminTest(RecipesAPITestCase):
+    """Новое фото рецепта в админке сбрасывает копии прежнего"""
+
+    def setUp(self):
+        super().setUp()
+        admin = self.create_user('admin')
+        admin.is_staff = admin.is_superuser = True
+        admin.save()
+        self.client.force_login(admin)
+
+    def change(self, recipe, image=None):
+        data = {
+            'name': recipe.name,
+            'author': recipe.author_id,
+            'text': recipe.text,
+            'tags': [tag.id for tag in recipe.tags.all()],
+            'cooking_time': recipe.cooking_time,
+            'favorites_count': 0,
+            'cart_count': 0,
+            'recipeingredients-TOTAL_FORMS': 0,
+            'recipeingredients-INITIAL_FORMS': 0,
+        }
+        if image is not None:
+            data['image'] = image
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe.id}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        recipe.refresh_from_db()
+
+    def test_image_change_resets_variants(self):
+        recipe = self.create_recipe()
+        recipe.recipeingredients.all().delete()
+        variants = {'card': {'webp': 'photos/card.webp'}}
+        Recipe.objects.filter(pk=recipe.pk).update(image_variants=variants)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.change(recipe)
+        self.assertEqual(recipe.image_variants, variants)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.change(
+                recipe, SimpleUploadedFile('photo.gif', GIF, 'image/gif'))
+        self.assertEqual(recipe.image_variants, {})
+        self.assertTrue(recipe.image.name.endswith('.gif'))
+        for callback in callbacks:
+            callback()
+        recipe.refresh_from_db()
+        self.assertNotIn(recipe.image_variants, ({}, variants))
@@ -0,0 +1,85 @@
+import json
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Subscribes
+
+from .base import RecipesTransactionTestCase
+
+
+class AsgiParityTest(RecipesTransactionTestCase):
+    """async-view из recipes/async_urls.py отвечают так же, как view под
+    WSGI: с теми же статусами, правами и пагинацией действий"""
+
+    def setUp(self):
+        super().setUp()
+        Subscribes.objects.create(user=self.user, following=self.author)
+        self.recipes = [
+            self.create_recipe(name=f'Картофель {number}')
+            for number in range(3)]
+        self.token = Token.objects.create(user=self.user).key
+
+    def get_wsgi(self, path, authorization):
+        headers = {}
+        if authorization:
+            headers['HTTP_AUTHORIZATION'] = authorization
+        response = self.client.get(path, **headers)
+        return response.status_code, json.loads(response.content)
+
+    def get_asgi(self, path, authorization):
+        headers = {}
+        if authorization:
+            headers['authorization'] = authorization
+        with override_settings(ROOT_URLCONF='foodgram.asgi_urls'):
+            response = async_to_sync(AsyncClient().get)(path, **headers)
+        return response.status_code, json.loads(response.content)
+
+    def assert_parity(self, path, params=None, authorization=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        wsgi = self.get_wsgi(path, authorization)
+        asgi = self.get_asgi(path, authorization)
+        self.assertEqual(asgi, wsgi, path)
+        return wsgi
+
+    def test_recipes(self):
+        recipe_id = self.recipes[0].id
+        self.assert_parity('/api/recipes/', {'limit': 2})
+        self.assert_parity('/api/recipes/', {'cursor': '', 'limit': 2})
+        self.assert_parity(f'/api/recipes/{recipe_id}/')
+        self.assert_parity('/api/recipes/999/')
+        self.assert_parity(
+            f'/api/recipes/{recipe_id}/', authorization=f'Token {self.token}')
+
+    def test_actions(self):
+        authorization = f'Token {self.token}'
+        status, _ = self.assert_parity('/api/recipes/feed/')
+        self.assertEqual(status, 401)
+        status, data = self.assert_parity(
+            '/api/recipes/feed/', {'limit': 2}, authorization)
+        self.assertEqual((status, len(data['results'])), (200, 2))
+        ingredients = f'{self.ingredients[0].id},{self.ingredients[5].id}'
+        status, data = self.assert_parity(
+            '/api/recipes/matching/', {'ingredients': ingredients,
+                                       'limit': 2, 'cursor': 'abc'})
+        self.assertEqual((status, data['count']), (200, 3))
+
+    def test_reference_data(self):
+        self.assert_parity('/api/tags/')
+        self.assert_parity(f'/api/tags/{self.tags[0].id}/')
+        self.assert_parity('/api/ingredients/', {'name': 'ингр'})
+
+    def test_search(self):
+        status, data = self.assert_parity(
+            '/api/recipes/search/', {'q': 'картоф', 'cursor': 'abc'})
+        self.assertEqual((status, data['count']), (200, 3))
+        status, data = self.assert_parity(
+            '/api/recipes/search/',
+            {'q': 'картоф', 'limit': 2, 'page': 2, 'tags': 'breakfast'})
+        self.assertEqual((status, len(data['results'])), (200, 1))
+        self.assertIsNotNone(data['previous'])
+        status, _ = self.assert_parity('/api/recipes/search/', {'q': ''})
+        self.assertEqual(status, 400)
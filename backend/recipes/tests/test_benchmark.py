@@ -0,0 +1,26 @@
+import json
+import os
+import tempfile
+
+import pytest
+from django.core.management import call_command
+
+from .base import RecipesAPITestCase
+
+
+@pytest.mark.benchmark
+class BenchmarkApiTest(RecipesAPITestCase):
+    """benchmark_api проходит все endpoint'ы на небольшом наборе данных
+    и не находит регрессий относительно собственного результата"""
+
+    def test_benchmark_api(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            options = {'users': 5, 'recipes': 20, 'iterations': 2}
+            call_command('benchmark_api', output=output, **options)
+            with open(output) as file:
+                endpoints = json.load(file)['endpoints']
+            call_command('benchmark_api', baseline=output, **options)
+        self.assertTrue(endpoints)
+        for name, result in endpoints.items():
+            self.assertLess(result['status'], 400, name)
@@ -0,0 +1,73 @@
+from recipes.models import Favorite, Recipe, ShoppingListItem
+
+from .base import RecipesAPITestCase
+
+
+class BulkRecipesTest(RecipesAPITestCase):
+    """Избранное и корзина списком рецептов за один запрос"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.first = cls.create_recipe(ingredients=cls.ingredients[:2])
+        cls.second = cls.create_recipe(ingredients=cls.ingredients[1:3])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def get_statuses(self, method, url, recipes):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipes}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [(item['id'], item['status'])
+                for item in response.data['results']]
+
+    def test_favorites(self):
+        url = '/api/recipes/favorite/bulk/'
+        Favorite.objects.create(user=self.user, recipe=self.first)
+        self.assertEqual(
+            self.get_statuses(
+                'post', url, [self.first.id, self.second.id, 999]),
+            [(self.first.id, 'exists'), (self.second.id, 'added'),
+             (999, 'not_found')])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.second.id).favorites_count, 1)
+        self.assertEqual(
+            self.get_statuses('delete', url, [self.second.id] * 2),
+            [(self.second.id, 'removed')])
+        self.assertEqual(
+            self.get_statuses('delete', url, [self.second.id]),
+            [(self.second.id, 'missing')])
+        self.assertEqual(
+            Recipe.objects.get(pk=self.second.id).favorites_count, 0)
+
+    def test_shopping_cart(self):
+        url = '/api/recipes/shopping_cart/bulk/'
+        self.get_statuses('post', url, [self.first.id, self.second.id])
+        self.get_statuses('post', url, [self.first.id])
+        amounts = dict(ShoppingListItem.objects.filter(
+            user=self.user).values_list('ingredients_id', 'amount'))
+        self.assertEqual(amounts, {
+            self.ingredients[0].id: 100, self.ingredients[1].id: 200,
+            self.ingredients[2].id: 100})
+        self.get_statuses('delete', url, [self.first.id])
+        amounts = dict(ShoppingListItem.objects.filter(
+            user=self.user, amount__gt=0).values_list(
+                'ingredients_id', 'amount'))
+        self.assertEqual(amounts, {
+            self.ingredients[1].id: 100, self.ingredients[2].id: 100})
+
+    def test_validation(self):
+        url = '/api/recipes/favorite/bulk/'
+        for recipes in ([], [0], list(range(1, 102)), 'abc'):
+            response = self.client.post(
+                url, {'recipes': recipes}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(
+            '/api/recipes/favorite/bulk/', {'recipes': [self.first.id]},
+            format='json')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.test import override_settings
+
+from recipes.feed import HEAVY_AUTHORS_KEY, get_backfill_authors
+from recipes.models import FeedEntry, Subscribes
+
+from .base import RecipesAPITestCase
+
+
+class FeedTest(RecipesAPITestCase):
+    """Лента подписок: раскладка рецептов по лентам при публикации
+    и чтение рецептов авторов с большим числом подписчиков"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = cls.create_user('other')
+
+    def subscribe(self, user, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Subscribes.objects.create(user=user, following=author)
+
+    def get_feed(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/recipes/feed/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_ids(self, user, **params):
+        return [recipe['id']
+                for recipe in self.get_feed(user, **params).data['results']]
+
+    def test_anonymous(self):
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_fan_out_and_paging(self):
+        old = self.create_recipe()
+        self.subscribe(self.user, self.author)
+        recipes = [old] + [self.create_recipe() for _ in range(4)]
+        self.create_recipe(author=self.other)
+        expected = [recipe.id for recipe in reversed(recipes)]
+        response = self.get_feed(self.user, limit=3)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        response = self.client.get(response.data['next'])
+        ids += [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(ids, expected)
+        self.assertIsNone(response.data['next'])
+
+    def test_unsubscribe(self):
+        self.subscribe(self.user, self.author)
+        self.create_recipe()
+        Subscribes.objects.filter(user=self.user).delete()
+        self.assertEqual(self.get_ids(self.user), [])
+
+    def test_unsubscribe_before_fill(self):
+        recipe = self.create_recipe()
+        with self.captureOnCommitCallbacks(execute=True):
+            subscription = Subscribes.objects.create(
+                user=self.user, following=self.author)
+            subscription.delete()
+        self.assertFalse(FeedEntry.objects.filter(recipe=recipe).exists())
+        self.assertEqual(self.get_ids(self.user), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_heavy_author(self):
+        self.subscribe(self.user, self.author)
+        self.subscribe(self.other, self.author)
+        cache.delete(HEAVY_AUTHORS_KEY)
+        recipe = self.create_recipe()
+        self.assertFalse(FeedEntry.objects.filter(recipe=recipe).exists())
+        self.assertEqual(self.get_ids(self.user), [recipe.id])
+        self.assertEqual(self.get_ids(self.other), [recipe.id])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_demoted_author_backfilled(self):
+        self.subscribe(self.user, self.author)
+        self.subscribe(self.other, self.author)
+        cache.delete(HEAVY_AUTHORS_KEY)
+        recipes = [self.create_recipe() for _ in range(2)]
+        Subscribes.objects.filter(user=self.other).delete()
+        cache.delete(HEAVY_AUTHORS_KEY)
+        expected = [recipe.id for recipe in reversed(recipes)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.get_ids(self.user), expected)
+        self.assertEqual(get_backfill_authors(), set())
+        self.assertEqual(self.get_ids(self.user), expected)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True)),
+            {recipe.id for recipe in recipes})
+        recipe = self.create_recipe()
+        self.assertTrue(FeedEntry.objects.filter(recipe=recipe).exists())
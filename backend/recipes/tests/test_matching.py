@@ -0,0 +1,68 @@
+from recipes.matching import MAX_INGREDIENTS, IngredientIndex
+
+from .base import RecipesAPITestCase
+
+
+class MatchingTest(RecipesAPITestCase):
+    """Что приготовить из имеющихся ингридиентов: сначала рецепты,
+    для которых есть всё, затем по числу недостающих"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        salt, water, potato, carrot = cls.ingredients[:4]
+        cls.soup = cls.create_recipe(ingredients=[salt, water, potato])
+        cls.puree = cls.create_recipe(ingredients=[salt, potato])
+        cls.salad = cls.create_recipe(ingredients=[carrot])
+
+    def match(self, ingredients, **params):
+        response = self.client.get('/api/recipes/matching/', {
+            'ingredients': ','.join(str(item.id) for item in ingredients),
+            **params})
+        self.assertEqual(response.status_code, 200)
+        return [(recipe['id'], recipe['missing'])
+                for recipe in response.data['results']]
+
+    def test_ranking(self):
+        salt, water, potato = self.ingredients[:3]
+        self.assertEqual(self.match([salt, potato]), [
+            (self.puree.id, 0), (self.soup.id, 1)])
+        self.assertEqual(self.match([water]), [
+            (self.soup.id, 2)])
+
+    def test_pages(self):
+        salt, potato = self.ingredients[0], self.ingredients[2]
+        self.assertEqual(
+            self.match([salt, potato], limit=1, page=2), [(self.soup.id, 1)])
+
+    def test_invalid_ids(self):
+        for value in ('', 'abc', '²', '1,²', ','.join(
+                str(number) for number in range(MAX_INGREDIENTS + 1))):
+            response = self.client.get(
+                '/api/recipes/matching/', {'ingredients': value})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_changes_from_journal(self):
+        salt, water, potato, carrot = self.ingredients[:4]
+        self.assertEqual(self.match([carrot]), [(self.salad.id, 0)])
+        # Индекс другого процесса, загруженный до изменений
+        other = IngredientIndex()
+        other.sync()
+        self.client.force_authenticate(self.author)
+        self.client.patch(f'/api/recipes/{self.puree.id}/', {
+            'ingredients': [
+                {'id': potato.id, 'amount': 1},
+                {'id': carrot.id, 'amount': 1}]}, format='json')
+        self.client.delete(f'/api/recipes/{self.salad.id}/')
+        self.assertEqual(
+            self.match([carrot]), [(self.puree.id, 1)])
+        self.assertEqual(
+            self.match([potato, carrot]),
+            [(self.puree.id, 0), (self.soup.id, 2)])
+        # Журнал и ингридиенты только изменённых рецептов
+        with self.assertNumQueries(2):
+            matched, totals = other.match([carrot.id])
+        self.assertEqual(matched, {self.puree.id: 1})
+        self.assertEqual(totals[self.puree.id], 2)
+        with self.assertNumQueries(1):
+            other.sync()
@@ -0,0 +1,148 @@
+import re
+import shutil
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.metrics import MetricsRegistry, RequestMetrics, registry
+from recipes.models import Tags
+
+from .base import RecipesAPITestCase
+
+METRICS = {
+    'ENABLED': True, 'SAMPLE_RATE': 1, 'LOW_OVERHEAD': False,
+    'SLOW_REQUEST_MS': 500, 'DUPLICATE_QUERIES': 5, 'TOKEN': 'secret'}
+
+
+@override_settings(REQUEST_METRICS=METRICS)
+class MetricsViewTest(RecipesAPITestCase):
+    """/api/_metrics только для сборщика с токеном и администраторов"""
+
+    def get(self, authorization=None, **params):
+        headers = {}
+        if authorization:
+            headers['HTTP_AUTHORIZATION'] = authorization
+        return self.client.get('/api/_metrics', params, **headers)
+
+    def test_anonymous(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(format='report').status_code, 403)
+        self.assertEqual(self.get('Bearer wrong').status_code, 403)
+
+    def test_metrics_token(self):
+        response = self.get('Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.get('Bearer secret', format='report').status_code, 200)
+
+    def test_user_token(self):
+        token = Token.objects.create(user=self.user)
+        self.assertEqual(self.get(f'Token {token.key}').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.get(f'Token {token.key}').status_code, 200)
+        self.assertEqual(self.get('Token wrong').status_code, 403)
+
+    @override_settings(REQUEST_METRICS={**METRICS, 'TOKEN': ''})
+    def test_empty_token(self):
+        self.assertEqual(self.get('Bearer ').status_code, 403)
+
+
+@override_settings(REQUEST_METRICS=METRICS)
+class RequestMetricsTest(RecipesAPITestCase):
+    """Server-Timing, число запросов к базе, повторы запросов и доля
+    измеряемых запросов"""
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def get_metrics(self):
+        response = self.client.get(
+            '/api/_metrics', HTTP_AUTHORIZATION='Bearer secret')
+        return response.content.decode()
+
+    def get_value(self, name, view='recipe-list'):
+        match = re.search(
+            rf'^foodgram_{name}{{view="{view}",method="GET"[^}}]*}} (\S+)$',
+            self.get_metrics(), re.MULTILINE)
+        return match and float(match[1])
+
+    def test_server_timing(self):
+        self.create_recipe()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/')
+        timing = response['Server-Timing']
+        queries = len(context.captured_queries)
+        self.assertIn(f'"{queries} queries, 0 duplicated"', timing)
+        self.assertRegex(
+            timing, r'^db;dur=[\d.]+;desc="[^"]+", '
+                    r'serializer;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertEqual(self.get_value('db_queries_total'), queries)
+        self.assertEqual(self.get_value('sampled_requests_total'), 1)
+
+    def test_duplicate_queries(self):
+        metrics = RequestMetrics()
+        with connection.execute_wrapper(metrics):
+            for ids in ([1], [1, 2], [1, 2, 3]):
+                list(Tags.objects.filter(id__in=ids))
+            list(Tags.objects.all())
+        self.assertEqual(metrics.queries, 4)
+        [(sql, count)] = metrics.duplicates.items()
+        self.assertEqual(count, 3)
+        self.assertIn('IN (...)', sql)
+        registry.observe('tags-list', 'GET', 200, 0.01, metrics)
+        self.assertEqual(
+            self.get_value('db_duplicate_queries_total', 'tags-list'), 2)
+        response = self.client.get(
+            '/api/_metrics', {'format': 'report'},
+            HTTP_AUTHORIZATION='Bearer secret')
+        self.assertIn(f'    x3 {sql}', response.content.decode())
+
+    @override_settings(REQUEST_METRICS={**METRICS, 'SAMPLE_RATE': 0.5})
+    def test_sample_rate(self):
+        with mock.patch('recipes.metrics.random.random', return_value=0.9):
+            response = self.client.get('/api/recipes/')
+        self.assertNotIn('Server-Timing', response)
+        with mock.patch('recipes.metrics.random.random', return_value=0.1):
+            response = self.client.get('/api/recipes/')
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(self.get_value('sampled_requests_total'), 1)
+        self.assertEqual(self.get_value(
+            'http_request_duration_seconds_count'), 2)
+
+
+class MetricsDirTest(RecipesAPITestCase):
+    """Метрики воркеров складываются через файлы в каталоге DIR"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(
+            REQUEST_METRICS={**METRICS, 'DIR': directory})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_workers_summed(self):
+        # Другой воркер пишет свой файл
+        worker = MetricsRegistry()
+        worker.observe('tags-list', 'GET', 200, 0.01)
+        worker.observe('tags-list', 'GET', 404, 0.01)
+        worker.flush()
+        registry.observe('tags-list', 'GET', 200, 0.02)
+        response = self.client.get(
+            '/api/_metrics', HTTP_AUTHORIZATION='Bearer secret')
+        content = response.content.decode()
+        self.assertIn(
+            'foodgram_http_requests_total{view="tags-list",method="GET",'
+            'status="200"} 2', content)
+        self.assertIn(
+            'foodgram_http_request_duration_seconds_count'
+            '{view="tags-list",method="GET"} 3', content)
@@ -0,0 +1,52 @@
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+@pytest.mark.slow
+class MergeDuplicateIngredientsTest(TransactionTestCase):
+    """Дубли ингридиентов сливаются до уникального ограничения, а их
+    количества в рецептах и списках покупок складываются"""
+    before = [('recipes', '0003_recipe_pub_date_id_idx')]
+    after = [('recipes', '0005_ingredients_unique')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_merge(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('auth', 'User')
+        Ingredients = apps.get_model('recipes', 'Ingredients')
+        Recipe = apps.get_model('recipes', 'Recipe')
+        RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+        ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+        user = User.objects.create(username='cook', email='cook@example.com')
+        salt, duplicate = (
+            Ingredients.objects.create(name='соль', measurement_unit='г')
+            for _ in range(2))
+        recipe = Recipe.objects.create(
+            author=user, name='Суп', text='Сварить', cooking_time=10,
+            image='photos/soup.png')
+        for ingredient, amount in ((salt, 5), (duplicate, 3)):
+            RecipeIngredients.objects.create(
+                recipe=recipe, ingredients=ingredient, amount=amount)
+            ShoppingListItem.objects.create(
+                user=user, ingredients=ingredient, amount=amount)
+
+        apps = self.migrate(self.after)
+        Ingredients = apps.get_model('recipes', 'Ingredients')
+        RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+        ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+        self.assertEqual(
+            list(Ingredients.objects.values_list('id', flat=True)), [salt.id])
+        for model in (RecipeIngredients, ShoppingListItem):
+            self.assertEqual(
+                list(model.objects.values_list('ingredients_id', 'amount')),
+                [(salt.id, 8)])
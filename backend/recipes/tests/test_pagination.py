@@ -0,0 +1,50 @@
+from recipes.models import Recipe
+
+from .base import RecipesAPITestCase
+
+
+class RecipesPaginationTest(RecipesAPITestCase):
+    """Страницы ленты по page с сортировкой и по курсору"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = [
+            cls.create_recipe(name=f'Рецепт {number}') for number in range(7)]
+        Recipe.objects.update(favorites_count=1, cart_count=1)
+
+    def get_ids(self, params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ordering_with_equal_counters(self):
+        ids = []
+        for page in (1, 2, 3):
+            ids += self.get_ids({
+                'ordering': '-cart_count', 'limit': 3, 'page': page})
+        self.assertEqual(
+            ids, sorted((recipe.id for recipe in self.recipes), reverse=True))
+
+    def test_cursor(self):
+        response = self.client.get(
+            '/api/recipes/', {'cursor': '', 'limit': 4})
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(response.data['next'])
+        ids += [recipe['id'] for recipe in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(
+            ids, [recipe.id for recipe in reversed(self.recipes)])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']], ids[:4])
+
+    def test_cursor_with_ordering(self):
+        response = self.client.get(
+            '/api/recipes/', {'cursor': '', 'ordering': '-favorites_count'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 404)
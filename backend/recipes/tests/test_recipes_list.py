@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favorite, ShoppingCart, Subscribes
+
+from .base import RecipesAPITestCase
+
+
+class RecipesListQueriesTest(RecipesAPITestCase):
+    """Страница ленты рецептов читается постоянным числом запросов,
+    сколько бы рецептов на ней ни было"""
+
+    def add_recipes(self, count):
+        for number in range(count):
+            recipe = self.create_recipe(
+                tags=self.tags, ingredients=self.ingredients[:3],
+                name=f'Рецепт {number}')
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(buyer=self.user, recipe=recipe)
+
+    def count_queries(self, limit):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                '/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context.captured_queries)
+
+    def test_anonymous_queries_do_not_grow(self):
+        self.add_recipes(3)
+        queries = self.count_queries(3)
+        self.add_recipes(6)
+        with self.assertNumQueries(queries):
+            self.client.get('/api/recipes/', {'limit': 9})
+
+    def test_user_queries_do_not_grow(self):
+        Subscribes.objects.create(user=self.user, following=self.author)
+        self.client.force_authenticate(self.user)
+        self.add_recipes(3)
+        queries = self.count_queries(3)
+        self.add_recipes(6)
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get('/api/recipes/', {'limit': 9})
+        self.assertTrue(all(
+            recipe['is_favorited'] and recipe['is_in_shopping_cart']
+            and recipe['author']['is_subscribed']
+            for recipe in response.data['results']))
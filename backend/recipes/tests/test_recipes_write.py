@@ -0,0 +1,93 @@
+import base64
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, RecipeIngredients
+
+from .base import PNG, RecipesAPITestCase
+
+IMAGE = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+
+class RecipesWriteTest(RecipesAPITestCase):
+    """Создание и изменение рецепта через API идут через services"""
+
+    def get_payload(self, **fields):
+        return {
+            'name': 'Сырники',
+            'text': 'Смешать и обжарить',
+            'cooking_time': 20,
+            'image': IMAGE,
+            'tags': [self.tags[0].id],
+            'ingredients': [
+                {'id': self.ingredients[0].id, 'amount': 200},
+                {'id': self.ingredients[1].id, 'amount': 2}],
+            **fields}
+
+    def test_create(self):
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/', self.get_payload(), format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertEqual(recipe.author, self.author)
+        self.assertEqual(response.data['author']['id'], self.author.id)
+        self.assertEqual(recipe.recipeingredients.count(), 2)
+
+    def test_put_and_patch(self):
+        recipe = self.create_recipe()
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                f'/api/recipes/{recipe.id}/',
+                self.get_payload(name='Блины', ingredients=[
+                    {'id': self.ingredients[2].id, 'amount': 300}]),
+                format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['name'], 'Блины')
+        self.assertEqual(
+            list(RecipeIngredients.objects.filter(
+                recipe=recipe).values_list('ingredients_id', 'amount')),
+            [(self.ingredients[2].id, 300)])
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', {'cooking_time': 5},
+            format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.name, recipe.cooking_time), ('Блины', 5))
+
+    def test_update_by_other_user_forbidden(self):
+        recipe = self.create_recipe()
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', {'cooking_time': 5},
+            format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_image_change_single_update(self):
+        recipe = self.create_recipe()
+        Recipe.objects.filter(pk=recipe.pk).update(
+            image_variants={'card': {'webp': 'photos/card.webp'}})
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', {'image': IMAGE}, format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, {
+            'card': {'webp': 'photos/card.webp'}})
+        image = 'data:image/gif;base64,' + (
+            'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/', {'image': image},
+                format='json')
+        self.assertEqual(response.status_code, 201)
+        updates = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "recipes_recipe" ')]
+        self.assertEqual(len(updates), 1)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, {})
+        self.assertTrue(recipe.image.name.endswith('.gif'))
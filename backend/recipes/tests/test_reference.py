@@ -0,0 +1,71 @@
+from django.test import override_settings
+
+from recipes import ingredients_index
+from recipes.cache import (ReferenceData, ingredients_reference, load_tags,
+                           tags_reference)
+from recipes.models import Tags
+
+from .base import RecipesAPITestCase
+
+
+class ReferenceDataTest(RecipesAPITestCase):
+    """Новый тэг сразу виден справочнику и проверке тэгов рецепта"""
+
+    def add_tag(self):
+        return Tags.objects.create(
+            name='snack', color='#49B64E', slug='snack')
+
+    def test_not_shared_cache_reads_version(self):
+        version, tags = tags_reference.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(tags_reference.get(), (version, tags))
+        tag = self.add_tag()
+        # Другой воркер: свои данные в процессе, версия из базы
+        new_version, tags = ReferenceData('tags', load_tags).get()
+        self.assertNotEqual(new_version, version)
+        self.assertIn(tag.id, tags)
+        self.assertEqual(tags_reference.get(), (new_version, tags))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_shared_cache_invalidated_on_save(self):
+        version, tags = tags_reference.get()
+        self.assertEqual(tags_reference.get()[0], version)
+        tag = Tags.objects.create(name='snack', color='#49B64E', slug='snack')
+        new_version, tags = tags_reference.get()
+        self.assertNotEqual(new_version, version)
+        self.assertIn(tag.id, tags)
+
+    def test_recipe_with_new_tag(self):
+        tag = self.add_tag()
+        recipe = self.create_recipe()
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', {'tags': [tag.id]},
+            format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [item['slug'] for item in response.data['tags']], ['snack'])
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/', {'tags': ['²']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/recipes/', {'tags': 'snack'})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [recipe.id])
+
+    def test_ingredients_autocomplete(self):
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'ингридиент 1', 'limit': 5})
+        self.assertEqual(
+            [item['id'] for item in response.data],
+            [self.ingredients[1].id])
+        # Справочник и индекс уже в процессе: только версия из базы
+        with self.assertNumQueries(1):
+            self.client.get('/api/ingredients/', {'name': 'ингр'})
+        self.assertIs(
+            ingredients_index.last_index[0], ingredients_reference.get()[1])
+        self.ingredients[1].name = 'соль'
+        self.ingredients[1].save()
+        response = self.client.get('/api/ingredients/', {'name': 'сол'})
+        self.assertEqual(
+            [item['id'] for item in response.data],
+            [self.ingredients[1].id])
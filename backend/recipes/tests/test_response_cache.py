@@ -0,0 +1,100 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .base import RecipesAPITestCase
+
+
+@override_settings(SHARED_CACHE=True)
+class ResponseCacheTest(RecipesAPITestCase):
+    """Ответы анонимным пользователям из кэша ответов и их
+    инвалидация при изменении рецепта"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.create_recipe(name='Суп')
+
+    def test_list_from_cache(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/recipes/')
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        not_modified = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_invalidation(self):
+        list_response = self.client.get('/api/recipes/')
+        detail_response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', {'name': 'Борщ'},
+                format='json')
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/recipes/')
+        self.assertNotEqual(response['ETag'], list_response['ETag'])
+        self.assertEqual(response.data['results'][0]['name'], 'Борщ')
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertNotEqual(response['ETag'], detail_response['ETag'])
+        self.assertEqual(response.data['name'], 'Борщ')
+
+    def test_user_not_cached(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/')
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_disabled_without_shared_cache(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Cache-Control', response)
+
+
+@override_settings(SHARED_CACHE=True)
+class FragmentsCacheTest(RecipesAPITestCase):
+    """Представления рецептов для пользователей с токеном: общие
+    в кэше, флаги пользователя — поверх них"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = cls.create_recipe(name='Суп')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_fragments(self):
+        self.client.force_authenticate(self.user)
+        rendered, _ = self.count_queries()
+        cached, response = self.count_queries()
+        self.assertLess(cached, rendered)
+        self.assertFalse(response.data['results'][0]['is_favorited'])
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        _, response = self.count_queries()
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+
+    def test_invalidation(self):
+        self.client.force_authenticate(self.author)
+        self.count_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', {'name': 'Борщ'},
+                format='json')
+        _, response = self.count_queries()
+        self.assertEqual(response.data['results'][0]['name'], 'Борщ')
+
+    @override_settings(SHARED_CACHE=False)
+    def test_disabled_without_shared_cache(self):
+        self.client.force_authenticate(self.user)
+        rendered, _ = self.count_queries()
+        self.assertEqual(self.count_queries()[0], rendered)
@@ -0,0 +1,60 @@
+from .base import RecipesAPITestCase
+
+
+class RecipesSearchTest(RecipesAPITestCase):
+    """Поиск рецептов по названию, ингридиентам и описанию
+    по убыванию релевантности"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.in_text = cls.create_recipe(
+            name='Пюре', text='Картофель размять с маслом')
+        cls.in_name = cls.create_recipe(
+            name='Картофельная запеканка', text='Запечь в духовке',
+            tags=cls.tags[1:2])
+        cls.other = cls.create_recipe(name='Суп', text='Сварить')
+
+    def search(self, params):
+        response = self.client.get('/api/recipes/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_ranking(self):
+        self.assertEqual(
+            self.search({'q': 'картоф'}), [self.in_name.id, self.in_text.id])
+
+    def test_all_words(self):
+        self.assertEqual(
+            self.search({'q': 'картофель масл'}), [self.in_text.id])
+
+    def test_ingredient_names(self):
+        self.assertEqual(len(self.search({'q': 'ингридиент'})), 3)
+
+    def test_filters(self):
+        self.assertEqual(
+            self.search({'q': 'картоф', 'tags': 'lunch'}), [self.in_name.id])
+
+    def test_page_and_limit(self):
+        self.assertEqual(
+            self.search({'q': 'картоф', 'limit': 1, 'page': 2}),
+            [self.in_text.id])
+
+    def test_cursor_is_ignored(self):
+        self.assertEqual(
+            self.search({'q': 'картоф', 'cursor': 'abc'}),
+            [self.in_name.id, self.in_text.id])
+
+    def test_empty_query(self):
+        response = self.client.get('/api/recipes/search/', {'q': ' '})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_changes(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{self.other.id}/', {'name': 'Картофельный суп'},
+            format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(self.other.id, self.search({'q': 'картоф'}))
+        self.client.delete(f'/api/recipes/{self.in_text.id}/')
+        self.assertNotIn(self.in_text.id, self.search({'q': 'картоф'}))
@@ -0,0 +1,50 @@
+from .base import RecipesAPITestCase
+
+
+class TagsFilterTest(RecipesAPITestCase):
+    """Фильтр ленты по нескольким тэгам: любой из них или все"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        breakfast, lunch, dinner = cls.tags
+        cls.breakfast = cls.create_recipe(tags=[breakfast])
+        cls.both = cls.create_recipe(tags=[breakfast, lunch])
+        cls.dinner = cls.create_recipe(tags=[dinner])
+
+    def get_ids(self, params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_any(self):
+        expected = {self.breakfast.id, self.both.id, self.dinner.id}
+        self.assertEqual(self.get_ids({'tags': ['breakfast', 'dinner']}),
+                         expected)
+        self.assertEqual(self.get_ids({'tags': 'breakfast,dinner'}),
+                         expected)
+
+    def test_no_duplicates(self):
+        response = self.client.get(
+            '/api/recipes/', {'tags': ['breakfast', 'lunch']})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_all(self):
+        self.assertEqual(
+            self.get_ids({'tags': 'breakfast,lunch', 'tags_mode': 'all'}),
+            {self.both.id})
+
+    def test_unknown_slug(self):
+        self.assertEqual(self.get_ids({'tags': 'unknown'}), set())
+        self.assertEqual(
+            self.get_ids({'tags': 'breakfast,unknown'}),
+            {self.breakfast.id, self.both.id})
+        self.assertEqual(
+            self.get_ids({'tags': 'breakfast,unknown', 'tags_mode': 'all'}),
+            set())
+
+    def test_invalid_mode(self):
+        response = self.client.get(
+            '/api/recipes/', {'tags': 'breakfast', 'tags_mode': 'some'})
+        self.assertEqual(response.status_code, 400)
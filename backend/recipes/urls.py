@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .metrics import metrics_view
 from .views import (FavouriteViewSet, IngredientsGetList, RecipeViewSet,
                     ShoppingCartLoadlist, ShoppingCartViewSet,
                     SubscribesViewSet, TagsViewSet)
@@ -12,9 +13,14 @@ router.register(r'ingredients', IngredientsGetList)
 router.register(r'tags', TagsViewSet)
 
 urlpatterns = [
+    path('_metrics', metrics_view),
     path('users/subscriptions/', SubscribesViewSet.as_view({'get': 'list'})),
     path('users/<id>/subscribe/', SubscribesViewSet.as_view(
         {'post': 'create', 'delete': 'delete'})),
+    path('recipes/shopping_cart/bulk/', ShoppingCartViewSet.as_view(
+        {'post': 'bulk_add', 'delete': 'bulk_remove'})),
+    path('recipes/favorite/bulk/', FavouriteViewSet.as_view(
+        {'post': 'bulk_add', 'delete': 'bulk_remove'})),
     path('recipes/<id>/shopping_cart/', ShoppingCartViewSet.as_view(
         {'post': 'create', 'delete': 'delete'})),
     path('recipes/<id>/favorite/', FavouriteViewSet.as_view(
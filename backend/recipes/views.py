@@ -1,117 +1,248 @@
+from collections import defaultdict
+from functools import partial
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
-from django.shortcuts import get_list_or_404, get_object_or_404
+from django.core.cache import cache
+from django.http import Http404, StreamingHttpResponse
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, viewsets, filters
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from recipes.models import (Favorite, Ingredients, Recipe, RecipeIngredients,
-                            ShoppingCart, Subscribes, Tags)
+from recipes.models import (Favorite, Ingredients, Recipe, ShoppingCart,
+                            Subscribes, Tags)
 
-from .filters import CustomFilter
-from .pagination import LimitPagination
+from .feed import get_feed_sources
+from .filters import CustomFilter, RecipeOrderingFilter
+from .cache import ingredients_reference, tags_reference
+from .ingredients_index import search_ingredients
+from .matching import MatchResults, parse_ingredient_ids
+from .pagination import FeedPagination, LimitPagination, SearchPagination
 from .permissions import OwnerAdminReadOnly
-from .serializers import (IngredientsSerializer, RecipePostSerializer,
+from .response_cache import get_response_key
+from .search import search_recipes
+from .serializers import (BulkRecipesSerializer, IngredientsSerializer,
+                          RecipePostSerializer,
                           ShoppingCartAndFavouriteSerializer,
                           SubscribeSerializer, TagsSerializer)
+from .services import (add_many_to_favorites, add_many_to_shopping_cart,
+                       add_to_favorites, add_to_shopping_cart,
+                       create_recipe, delete_recipe,
+                       remove_from_favorites, remove_from_shopping_cart,
+                       remove_many_from_favorites,
+                       remove_many_from_shopping_cart, update_recipe)
+from .shopping_list import SHOPPING_LIST_FORMATS, get_shopping_list
 
 User = get_user_model()
 
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_CACHE_SECONDS = 300
 
-class TagsViewSet(mixins.RetrieveModelMixin,
+
+class ReferenceDataMixin:
+    """Чтение справочника из кэша без запросов к базе, с ETag и 304"""
+    reference = None
+
+    def get_reference_response(self, request, get_data):
+        version, data = self.reference.get()
+        etag = f'"{self.reference.name}-{version}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(get_data(data))
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_reference_response(
+            request, lambda data: list(data.values()))
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_item(data):
+            try:
+                return data[int(kwargs[self.lookup_field])]
+            except (KeyError, ValueError):
+                raise Http404
+        return self.get_reference_response(request, get_item)
+
+
+class AnonymousResponseCacheMixin:
+    """Ответы анонимным пользователям из кэша ответов, с ETag,
+    Last-Modified и Cache-Control для nginx; ответы пользователю с токеном
+    в общих кэшах не сохраняются"""
+
+    def get_cached_response(self, request, render, recipe_id=None):
+        if request.user.is_authenticated:
+            response = render()
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            response = self.get_anonymous_response(request, render, recipe_id)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def get_anonymous_response(self, request, render, recipe_id):
+        cache_params = get_response_key(request, recipe_id)
+        if cache_params is None:
+            return render()
+        key, etag, version = cache_params
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(version))
+        if response is None:
+            data = cache.get(key)
+            if data is None:
+                response = render()
+                if response.status_code != HTTPStatus.OK:
+                    return response
+                cache.set(key, response.data,
+                          settings.RECIPES_RESPONSE_CACHE['TIMEOUT'])
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(version)
+        patch_cache_control(
+            response, public=True,
+            max_age=settings.RECIPES_RESPONSE_CACHE['MAX_AGE'])
+        return response
+
+
+class TagsViewSet(ReferenceDataMixin, mixins.RetrieveModelMixin,
                   mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = Tags.objects.all()
     serializer_class = TagsSerializer
     permission_classes = [AllowAny]
     pagination_class = None
+    reference = tags_reference
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipePostSerializer
     pagination_class = LimitPagination
     permission_classes = [OwnerAdminReadOnly]
-    filter_backends = [DjangoFilterBackend, ]
+    filter_backends = [DjangoFilterBackend, RecipeOrderingFilter]
     filterset_class = CustomFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'cart_count')
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'search', 'matching'):
+            return Recipe.objects.only('id', 'author_id', 'pub_date')
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user)
 
-    def perform_create(self, serializer):
-        author = self.request.user
-        return serializer.save(author=author)
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        render = partial(self.render_recipe, request, *args, **kwargs)
+        try:
+            recipe_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            return render()
+        return self.get_cached_response(request, render, recipe_id)
+
+    @action(detail=False, pagination_class=SearchPagination)
+    def search(self, request):
+        """Поиск по названию, ингридиентам и описанию рецепта с учётом
+        фильтров ленты, по убыванию релевантности"""
+        queryset = search_recipes(
+            self.filter_queryset(self.get_queryset()),
+            request.query_params.get('q', ''))
+        if queryset is None:
+            msg = 'Передайте строку поиска в параметре q'
+            return Response(msg, status=HTTPStatus.BAD_REQUEST)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, pagination_class=SearchPagination)
+    def matching(self, request):
+        """Что приготовить из имеющихся ингридиентов: сначала рецепты,
+        для которых есть всё, затем по числу недостающих ингридиентов"""
+        ingredient_ids = parse_ingredient_ids(
+            request.query_params.getlist('ingredients'))
+        if not ingredient_ids:
+            msg = 'Передайте id ингридиентов в параметре ingredients'
+            return Response(msg, status=HTTPStatus.BAD_REQUEST)
+        page = self.paginate_queryset(
+            MatchResults(self.get_queryset(), ingredient_ids))
+        missing = {recipe.pk: recipe.missing for recipe in page}
+        data = self.get_serializer(page, many=True).data
+        for recipe in data:
+            recipe['missing'] = missing[recipe['id']]
+        return self.get_paginated_response(data)
 
-    def perform_update(self, serializer):
-        author = self.request.user
-        return serializer.save(author=author)
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Новые рецепты авторов, на которых подписан пользователь,
+        по курсору"""
+        rows = self.paginate_queryset(get_feed_sources(request.user))
+        serializer = self.get_serializer(
+            [Recipe(pk=recipe_id) for _, recipe_id in rows], many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def perform_destroy(self, instance):
+        delete_recipe(instance)
+
+    def render_recipe(self, request, *args, **kwargs):
+        return self.get_recipe_response(self.get_object(), HTTPStatus.OK)
+
+    def get_recipe_response(self, recipe, status):
+        serializer = self.get_serializer([recipe], many=True)
+        return Response(serializer.data[0], status=status)
 
     def create(self, request, *args, **kwargs):
-        author = self.request.user
-        serializer = RecipePostSerializer(data=request.data)
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        tags = serializer.validated_data.pop('tags')
-        ingredients_all = serializer.validated_data.pop(
-            'recipeingredients')
-        recipe = Recipe.objects.create(
-            author=author, **serializer.validated_data)
-        for value in tags:
-            tags_id = value.id
-            recipe.tags.add(get_object_or_404(Tags, pk=tags_id))
-        for value in ingredients_all:
-            RecipeIngredients.objects.create(
-                ingredients=Ingredients.objects.get(
-                    id=value['ingredients'].get('id')), amount=value.get(
-                        'amount'), recipe_id=recipe.id).save()
-            rec_ingrid = RecipeIngredients.objects.get(
-                ingredients=Ingredients.objects.get(
-                    id=value['ingredients'].get('id')), amount=value.get(
-                        'amount'), recipe_id=recipe.id)
-            ingredients = Ingredients.objects.get(
-                id=value['ingredients'].get('id'))
-            recipe.ingredients.add(ingredients)
-            recipe.recipeingredients.add(rec_ingrid)
-            serializer = RecipePostSerializer(instance=recipe)
-        return Response(serializer.data, status=HTTPStatus.CREATED)
-
-    def partial_update(self, request, pk=None):
-        instance = get_object_or_404(Recipe, pk=pk)
-        instance.tags.clear()
-        RecipeIngredients.objects.filter(recipe=instance).delete()
-        serializer = RecipePostSerializer(
-            instance, data=request.data, partial=True)
+        recipe = create_recipe(request.user, serializer.validated_data)
+        return self.get_recipe_response(recipe, HTTPStatus.CREATED)
+
+    def update(self, request, *args, partial=False, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(
+            instance, data=request.data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        instance.id = serializer.validated_data.get('id', instance.id)
-        tags = serializer.validated_data.pop('tags')
-        ingredients = serializer.validated_data.pop('recipeingredients')
-        instance.name = serializer.validated_data.get('name', instance.id)
-        instance.text = serializer.validated_data.get('text', instance.id)
-        instance.cooking_time = serializer.validated_data.get(
-            'cooking_time', instance.id)
-        instance.image = serializer.validated_data.get('image', instance.id)
-        for value in tags:
-            tags_id = value.id
-            instance.tags.add(get_object_or_404(Tags, pk=tags_id))
-        for value in ingredients:
-            RecipeIngredients.objects.create(
-                ingredients=Ingredients.objects.get(
-                    id=value['ingredients'].get('id')), amount=value.get(
-                        'amount'), recipe_id=instance.id).save()
-            ingredients = Ingredients.objects.get(
-                id=value['ingredients'].get('id'))
-            instance.ingredients.add(ingredients)
-        instance.save()
-        serializer = RecipePostSerializer(instance)
-        return Response(serializer.data, status=HTTPStatus.CREATED)
-
-
-class IngredientsGetList(viewsets.ReadOnlyModelViewSet):
+        recipe = update_recipe(instance, serializer.validated_data)
+        return self.get_recipe_response(recipe, HTTPStatus.CREATED)
+
+
+class IngredientsGetList(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredients.objects.all()
     serializer_class = IngredientsSerializer
     filter_backends = (filters.SearchFilter,)
     search_fields = ('^name',)
     permission_classes = [AllowAny]
     pagination_class = None
+    reference = ingredients_reference
+
+    def list(self, request, *args, **kwargs):
+        if 'search' in request.query_params:
+            return super(ReferenceDataMixin, self).list(
+                request, *args, **kwargs)
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        try:
+            limit = min(int(request.query_params['limit']),
+                        AUTOCOMPLETE_MAX_LIMIT)
+        except (KeyError, ValueError):
+            limit = AUTOCOMPLETE_LIMIT
+        response = self.get_reference_response(
+            request,
+            lambda data: search_ingredients(name, max(limit, 1), data))
+        patch_cache_control(
+            response, public=True, max_age=AUTOCOMPLETE_CACHE_SECONDS)
+        return response
 
 
 class SubscribesViewSet(viewsets.ModelViewSet):
@@ -120,8 +251,34 @@ class SubscribesViewSet(viewsets.ModelViewSet):
     pagination_class = LimitPagination
     permission_classes = [IsAuthenticated]
 
+    cursor_ordering = ('id',)
+
     def get_queryset(self):
-        return get_list_or_404(User, following__user=self.request.user)
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            recipes_count=Count('recipe', distinct=True)
+        ).order_by('id')
+
+    def paginate_queryset(self, queryset):
+        authors = super().paginate_queryset(queryset)
+        if authors is None:
+            return authors
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            recipes_limit = None
+        recipes = Recipe.objects.latest_for_authors(
+            [author.id for author in authors], recipes_limit
+        ).only('id', 'author_id', 'pub_date')
+        recipes = RecipePostSerializer(
+            recipes, many=True, context=self.get_serializer_context()).data
+        recipes_by_author = defaultdict(list)
+        for recipe in recipes:
+            recipes_by_author[recipe['author']['id']].append(recipe)
+        for author in authors:
+            author.latest_recipes = recipes_by_author[author.id]
+        return authors
 
     def create(self, request, *args, **kwargs):
         id = self.kwargs.get('id')
@@ -150,54 +307,87 @@ class SubscribesViewSet(viewsets.ModelViewSet):
         return Response(msg)
 
 
-class FavouriteViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
-                       viewsets.GenericViewSet):
+class BulkRecipesMixin:
+    """Добавление и удаление списка рецептов {"recipes": [id, ...]}
+    одним запросом: рецепты проверяются одним in_bulk, связи меняются
+    одним запросом, в ответе — статус каждого id"""
+    add_many = None
+    remove_many = None
+
+    def get_bulk_recipes(self, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(
+            serializer.validated_data['recipes']))
+        return recipe_ids, Recipe.objects.only('id').in_bulk(recipe_ids)
+
+    def get_bulk_response(self, recipe_ids, found, changed, status):
+        changed = set(changed)
+        return Response({'results': [
+            {'id': recipe_id,
+             'status': ('not_found' if recipe_id not in found
+                        else status[recipe_id in changed])}
+            for recipe_id in recipe_ids]})
+
+    def bulk_add(self, request, *args, **kwargs):
+        recipe_ids, found = self.get_bulk_recipes(request)
+        added = self.add_many(request.user, list(found))
+        return self.get_bulk_response(
+            recipe_ids, found, added, {True: 'added', False: 'exists'})
+
+    def bulk_remove(self, request, *args, **kwargs):
+        recipe_ids, found = self.get_bulk_recipes(request)
+        removed = self.remove_many(request.user, list(found))
+        return self.get_bulk_response(
+            recipe_ids, found, removed, {True: 'removed', False: 'missing'})
+
+
+class FavouriteViewSet(BulkRecipesMixin, mixins.CreateModelMixin,
+                       mixins.DestroyModelMixin, viewsets.GenericViewSet):
     queryset = Favorite.objects.all()
     serializer_class = ShoppingCartAndFavouriteSerializer
     permission_classes = [IsAuthenticated]
+    add_many = staticmethod(add_many_to_favorites)
+    remove_many = staticmethod(remove_many_from_favorites)
 
     def create(self, request, *args, **kwargs):
         id = self.kwargs.get('id')
         get_recipe = get_object_or_404(Recipe, id=id)
-        if Favorite.objects.filter(user=request.user,
-                                   recipe=get_recipe).exists():
+        if not add_to_favorites(request.user, get_recipe):
             msg = 'Рецепт уже добавлен в избранное'
             return Response(msg, status=HTTPStatus.BAD_REQUEST)
-        Favorite.objects.create(user=request.user, recipe=get_recipe)
         msg = 'Рецепт успешно добавлен в избранное'
         return Response(msg, HTTPStatus.CREATED)
 
     def delete(self, request, *args, **kwargs):
-        user_id = request.user.id
         recipe_id = self.kwargs['id']
-        get_object_or_404(Favorite, user__id=user_id,
-                          recipe__id=recipe_id).delete()
+        if not remove_from_favorites(request.user, recipe_id):
+            raise Http404
         msg = 'Рецепт успешно удалён из списка избранного'
         return Response(msg)
 
 
-class ShoppingCartViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
-                          viewsets.GenericViewSet):
+class ShoppingCartViewSet(BulkRecipesMixin, mixins.CreateModelMixin,
+                          mixins.DestroyModelMixin, viewsets.GenericViewSet):
     queryset = ShoppingCart.objects.all()
     serializer_class = ShoppingCartAndFavouriteSerializer
     permission_classes = [IsAuthenticated]
+    add_many = staticmethod(add_many_to_shopping_cart)
+    remove_many = staticmethod(remove_many_from_shopping_cart)
 
     def create(self, request, *args, **kwargs):
         id = self.kwargs.get('id')
         get_recipe = get_object_or_404(Recipe, id=id)
-        if ShoppingCart.objects.filter(buyer=request.user,
-                                       recipe=get_recipe).exists():
+        if not add_to_shopping_cart(request.user, get_recipe):
             msg = 'Рецепт уже добавлен в список покупок'
             return Response(msg, status=HTTPStatus.BAD_REQUEST)
-        ShoppingCart.objects.create(buyer=request.user, recipe=get_recipe)
         msg = 'Рецепт успешно добавлен в список покупок'
         return Response(msg, HTTPStatus.CREATED)
 
     def delete(self, request, *args, **kwargs):
-        buyer_id = request.user.id
         recipe_id = self.kwargs['id']
-        get_object_or_404(ShoppingCart, buyer__id=buyer_id,
-                          recipe__id=recipe_id).delete()
+        if not remove_from_shopping_cart(request.user, recipe_id):
+            raise Http404
         msg = 'Рецепт успешно удалён из списка покупок'
         return Response(msg)
 
@@ -205,31 +395,18 @@ class ShoppingCartViewSet(mixins.CreateModelMixin, mixins.DestroyModelMixin,
 class ShoppingCartLoadlist(APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_rows(self):
+        return get_shopping_list(self.request.user).iterator()
+
     def get(self, request, format=None):
-        user = self.request.user
-        shopping_cart = user.shoppingcart.all()
-        s_voc = {}
-        for value in shopping_cart:
-            recipe = value.recipe
-            ingreds = RecipeIngredients.objects.filter(recipe=recipe)
-            if ingreds:
-                for ing in ingreds:
-                    amount = ing.amount
-                    name = ing.ingredients.name
-                    measurement_unit = ing.ingredients.measurement_unit
-                    if name in s_voc:
-                        s_voc[name]["amount"] = (
-                            s_voc[name]["amount"] + amount)
-                    else:
-                        s_voc[name] = {
-                            'measurement_unit': measurement_unit,
-                            'amount': amount}
-            shopping_list = list()
-            for value in s_voc:
-                shopping_list.append(f'{value}-{s_voc[value]["amount"]}'
-                                     f'{s_voc[value]["measurement_unit"]} \n')
-
-            response = HttpResponse(shopping_list,
-                                    'Content-Type: text/plain; charset=utf-8')
-            response['Content-Disposition'] = 'attachment; filename="wish.txt"'
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            msg = (f'Формат {file_format} не поддерживается, доступны: '
+                   f'{", ".join(SHOPPING_LIST_FORMATS)}')
+            return Response(msg, status=HTTPStatus.BAD_REQUEST)
+        content_type, render = SHOPPING_LIST_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            render(self.get_rows()), content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="wish.{file_format}"')
         return response
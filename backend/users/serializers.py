@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer
+from recipes.metrics import TimedSerializerMixin
 from recipes.models import Subscribes
 from rest_framework import serializers
 
@@ -31,7 +32,7 @@ class LoginUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserProfileSerializer(UserSerializer):
+class UserProfileSerializer(TimedSerializerMixin, UserSerializer):
     '''Сериализатор для регистрации просмотра профайла пользователя
         действует на все endpoint's with user/..'''
     is_subscribed = serializers.SerializerMethodField()
@@ -43,6 +44,8 @@ class UserProfileSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         """проверка поля is_subscribed на наличие подписок"""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -50,7 +53,8 @@ class UserProfileSerializer(UserSerializer):
                                          following=obj.id).exists()
 
 
-class CurrentUserProfileSerializer(UserSerializer):
+class CurrentUserProfileSerializer(TimedSerializerMixin,
+                                   UserSerializer):
     '''Сериализатор для просмотра текущего пользователя
         users/me'''
     is_subscribed = serializers.SerializerMethodField()
@@ -66,6 +70,8 @@ class CurrentUserProfileSerializer(UserSerializer):
         return attrs
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
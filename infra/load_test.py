@@ -0,0 +1,73 @@
+"""
+Нагрузочный тест API: несколько потоков в течение заданного времени
+запрашивают адреса по кругу через keep-alive соединения и печатают
+пропускную способность, p50/p99 и число ошибок.
+
+    python load_test.py http://localhost/api/recipes/ \
+        http://localhost/api/tags/ --concurrency 32 --duration 30
+"""
+
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def worker(urls, deadline, token, results):
+    connections = {}
+    headers = {'Authorization': f'Token {token}'} if token else {}
+    index = 0
+    while time.perf_counter() < deadline:
+        url = urls[index % len(urls)]
+        index += 1
+        if url.netloc not in connections:
+            connections[url.netloc] = http.client.HTTPConnection(
+                url.netloc, timeout=30)
+        connection = connections[url.netloc]
+        path = url.path + (f'?{url.query}' if url.query else '')
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            del connections[url.netloc]
+            ok = False
+        results.append((time.perf_counter() - started, ok))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--token')
+    args = parser.parse_args()
+    urls = [urlsplit(url) for url in args.urls]
+    results = []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(
+            target=worker, args=(urls, deadline, args.token, results))
+        for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    timings = sorted(duration * 1000 for duration, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    print(f'Запросов: {len(results)}, ошибок: {errors}, '
+          f'{len(results) / elapsed:.1f} запросов/с')
+    if timings:
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f'p50 {statistics.median(timings):.1f} мс, p99 {p99:.1f} мс')
+
+
+if __name__ == '__main__':
+    main()